@@ -1,8 +1,16 @@
 import streamlit as st
 
-from dss.analytics import get_kpis
+from dss.analytics import obtener_contexto
 from dss.auth import login
-from dss.data_sources import cargar_df_asignaciones, cargar_df_proyectos
+from dss.config import FILTROS_SQL
+from dss.data_sources import (
+    cargar_df_asignaciones,
+    cargar_df_asignaciones_filtrado,
+    cargar_df_proyectos,
+    cargar_df_proyectos_filtrado,
+    cargar_opciones_filtros,
+    opciones_filtros,
+)
 from dss.ui.views import render_detalle, render_prediccion, render_scorecard, render_metricas_calculadas, render_okrs, render_analisis_visual
 
 st.set_page_config(page_title="DSS: Decision Support System", layout="wide")
@@ -25,25 +33,29 @@ def main():
 
     login()
 
-    df_proyectos = cargar_df_proyectos()
-    df_asignaciones = cargar_df_asignaciones()
+    if FILTROS_SQL:
+        # Sólo se traen de la BD las filas que cumplen los filtros (ver DSS_FILTROS_SQL)
+        opciones = cargar_opciones_filtros()
+    else:
+        df_proyectos = cargar_df_proyectos()
+        df_asignaciones = cargar_df_asignaciones()
+        opciones = opciones_filtros(df_proyectos, df_asignaciones)
 
     st.sidebar.header("Filtros analíticos")
-    anios = sorted(df_proyectos["AnioFin"].dropna().unique())
-    meses = sorted(df_proyectos["MesFin"].dropna().unique())
-    clientes = sorted(df_proyectos["CodigoClienteReal"].dropna().unique())
-    proyectos = sorted(df_proyectos["CodigoProyecto"].dropna().unique())
-    roles = sorted(df_asignaciones["Rol"].dropna().unique())
-
     filtros = {
-        "anio": st.sidebar.multiselect("Año de fin", anios, default=anios),
-        "mes": st.sidebar.multiselect("Mes de fin", meses, default=meses),
-        "cliente": st.sidebar.multiselect("Cliente", clientes),
-        "proyecto": st.sidebar.multiselect("Proyecto", proyectos),
-        "rol": st.sidebar.multiselect("Rol/Empleado", roles),
+        "anio": st.sidebar.multiselect("Año de fin", opciones["anio"], default=opciones["anio"]),
+        "mes": st.sidebar.multiselect("Mes de fin", opciones["mes"], default=opciones["mes"]),
+        "cliente": st.sidebar.multiselect("Cliente", opciones["cliente"]),
+        "proyecto": st.sidebar.multiselect("Proyecto", opciones["proyecto"]),
+        "rol": st.sidebar.multiselect("Rol/Empleado", opciones["rol"]),
     }
 
-    kpis = get_kpis(df_proyectos, df_asignaciones, filtros)
+    if FILTROS_SQL:
+        df_proyectos = cargar_df_proyectos_filtrado(filtros)
+        df_asignaciones = cargar_df_asignaciones_filtrado(filtros)
+
+    # Filtrado, KPIs y vistas OLAP se calculan una sola vez por selección y se comparten entre pestañas
+    contexto = obtener_contexto(df_proyectos, df_asignaciones, filtros)
 
     # Tabs principales: Balanced Scorecard, Dashboard y Modelo de Predicción (para admin)
     main_tab_names = [" Balanced Scorecard", " Dashboard"]
@@ -58,9 +70,9 @@ def main():
         bsc_tabs = st.tabs(["MAIN", "OKRs"])
         
         with bsc_tabs[0]:
-            render_scorecard(df_proyectos, df_asignaciones, filtros)
+            render_scorecard(contexto)
         with bsc_tabs[1]:
-            render_okrs(df_proyectos, df_asignaciones, filtros)
+            render_okrs(contexto)
     
     # ============= TAB 2: DASHBOARD =============
     with main_tabs[1]:
@@ -68,16 +80,17 @@ def main():
         dashboard_tabs = st.tabs(["Análisis Visual", "Análisis Detallado", "Métricas Calculadas"])
         
         with dashboard_tabs[0]:
-            render_analisis_visual(df_proyectos, df_asignaciones, filtros)
+            render_analisis_visual(contexto)
         with dashboard_tabs[1]:
-            render_detalle(df_proyectos, df_asignaciones, filtros)
+            render_detalle(contexto)
         with dashboard_tabs[2]:
             render_metricas_calculadas(filtros)
     
     # ============= TAB 3: MODELO DE PREDICCIÓN (solo para admin) =============
     if st.session_state.auth.get("role") == "project_manager":
         with main_tabs[2]:
-            render_prediccion(df_proyectos, kpis)
+            # El modelo se entrena siempre con el histórico completo, no con la selección del sidebar
+            render_prediccion(cargar_df_proyectos() if FILTROS_SQL else df_proyectos, contexto.kpis)
 
 
 if __name__ == "__main__":
@@ -1,39 +1,100 @@
-from typing import Dict
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
+from .cache import memo_por_frame
+
+# Columna sobre la que actúa cada filtro del sidebar
+COLUMNAS_FILTRO_PROYECTOS = {
+    "anio": "AnioFin",
+    "mes": "MesFin",
+    "cliente": "CodigoClienteReal",
+    "proyecto": "CodigoProyecto",
+}
+COLUMNAS_FILTRO_ASIGNACIONES = {
+    "anio": "Anio",
+    "mes": "Mes",
+    "proyecto": "CodigoProyecto",
+    "rol": "Rol",
+}
+
+
+class IndiceFiltros:
+    """
+    Índice invertido valor -> posiciones de fila para cada dimensión filtrable
+
+    Por dimensión guarda los valores distintos y las posiciones de fila agrupadas
+    por valor (formato CSR: `orden[offsets[i]:offsets[i + 1]]` son las filas del
+    valor i). Un diccionario de filtros se resuelve marcando esas posiciones e
+    intersectando las dimensiones, sin recorrer ni copiar el DataFrame.
+    """
+
+    def __init__(self, df: pd.DataFrame, columnas: Dict[str, str]):
+        self.n_filas = len(df)
+        self._dimensiones = {}
+        for filtro, columna in columnas.items():
+            if columna not in df.columns:
+                continue
+            # NaN recibe su propio código para conservar la semántica de isin
+            codigos, valores = pd.factorize(df[columna].to_numpy(), use_na_sentinel=False)
+            orden = np.argsort(codigos, kind="stable")
+            offsets = np.zeros(len(valores) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(codigos, minlength=len(valores)), out=offsets[1:])
+            self._dimensiones[filtro] = (pd.Index(valores), orden, offsets)
+
+    def posiciones(self, filtros: Dict) -> Optional[np.ndarray]:
+        """
+        Resuelve los filtros activos a posiciones de fila
+
+        Args:
+            filtros: Diccionario {filtro: valores seleccionados}
+
+        Returns:
+            Posiciones ordenadas que cumplen todos los filtros, o None si no hay filtros activos
+        """
+        seleccion = None
+        for filtro, (valores, orden, offsets) in self._dimensiones.items():
+            seleccionados = filtros.get(filtro)
+            if not seleccionados:
+                continue
+            mascara = np.zeros(self.n_filas, dtype=bool)
+            for codigo in valores.get_indexer(list(seleccionados)):
+                if codigo >= 0:
+                    mascara[orden[offsets[codigo]:offsets[codigo + 1]]] = True
+            seleccion = mascara if seleccion is None else seleccion & mascara
+        return None if seleccion is None else np.flatnonzero(seleccion)
+
+
+def _filtrar(df: pd.DataFrame, filtros: Dict, columnas: Dict[str, str]) -> pd.DataFrame:
+    indice = memo_por_frame(df, f"indice_filtros:{sorted(columnas.items())}", lambda d: IndiceFiltros(d, columnas))
+    posiciones = indice.posiciones(filtros)
+    if posiciones is None:
+        return df.copy(deep=False)
+    return df.take(posiciones)
+
 
 def aplicar_filtros(df: pd.DataFrame, filtros: Dict) -> pd.DataFrame:
-    filtrado = df.copy()
-    if filtros.get("anio"):
-        filtrado = filtrado[filtrado["AnioFin"].isin(filtros["anio"])]
-    if filtros.get("mes"):
-        filtrado = filtrado[filtrado["MesFin"].isin(filtros["mes"])]
-    if filtros.get("cliente"):
-        filtrado = filtrado[filtrado["CodigoClienteReal"].isin(filtros["cliente"])]
-    if filtros.get("proyecto"):
-        filtrado = filtrado[filtrado["CodigoProyecto"].isin(filtros["proyecto"])]
-    return filtrado
+    return _filtrar(df, filtros, COLUMNAS_FILTRO_PROYECTOS)
 
 
 def aplicar_filtros_asignaciones(df: pd.DataFrame, filtros: Dict) -> pd.DataFrame:
-    filtrado = df.copy()
-    if filtros.get("anio"):
-        filtrado = filtrado[filtrado["Anio"].isin(filtros["anio"])]
-    if filtros.get("mes"):
-        filtrado = filtrado[filtrado["Mes"].isin(filtros["mes"])]
-    if filtros.get("proyecto"):
-        filtrado = filtrado[filtrado["CodigoProyecto"].isin(filtros["proyecto"])]
-    if filtros.get("rol"):
-        filtrado = filtrado[filtrado["Rol"].isin(filtros["rol"])]
-    return filtrado
+    return _filtrar(df, filtros, COLUMNAS_FILTRO_ASIGNACIONES)
 
 
 def get_kpis(df_proy: pd.DataFrame, df_asig: pd.DataFrame, filtros: Dict) -> Dict:
-    proyectos = aplicar_filtros(df_proy, filtros)
-    asignaciones = aplicar_filtros_asignaciones(df_asig, filtros)
+    return calcular_kpis(aplicar_filtros(df_proy, filtros), aplicar_filtros_asignaciones(df_asig, filtros))
+
+
+def _promedio(df: pd.DataFrame, columna: str) -> float:
+    # Las tasas se guardan en float32 (ver ESQUEMA_DWH); el promedio se acumula en float64
+    return df[columna].astype("float64").mean() if not df.empty else np.nan
 
+
+def calcular_kpis(proyectos: pd.DataFrame, asignaciones: pd.DataFrame) -> Dict:
+    """KPIs sobre proyectos y asignaciones ya filtrados"""
     cumplimiento = 1 - (proyectos["CosteReal"] - proyectos["Presupuesto"]) / proyectos[
         "Presupuesto"
     ]
@@ -54,21 +115,98 @@ def get_kpis(df_proy: pd.DataFrame, df_asig: pd.DataFrame, filtros: Dict) -> Dic
         "penalizaciones_sobre_presupuesto": penalizaciones.mean() if not proyectos.empty else np.nan,
         "proyectos_a_tiempo": proyectos_a_tiempo,
         "proyectos_cancelados": proyectos_cancelados,
-        "porcentaje_tareas_retrasadas": proyectos["PorcentajeTareasRetrasadas"].mean()
-        if not proyectos.empty
-        else np.nan,
-        "porcentaje_hitos_retrasados": proyectos["PorcentajeHitosRetrasados"].mean()
-        if not proyectos.empty
-        else np.nan,
-        "tasa_errores": proyectos["TasaDeErroresEncontrados"].mean() if not proyectos.empty else np.nan,
-        "productividad_promedio": proyectos["ProductividadPromedio"].mean() if not proyectos.empty else np.nan,
-        "tasa_exito_pruebas": proyectos["TasaDeExitoEnPruebas"].mean() if not proyectos.empty else np.nan,
+        "porcentaje_tareas_retrasadas": _promedio(proyectos, "PorcentajeTareasRetrasadas"),
+        "porcentaje_hitos_retrasados": _promedio(proyectos, "PorcentajeHitosRetrasados"),
+        "tasa_errores": _promedio(proyectos, "TasaDeErroresEncontrados"),
+        "productividad_promedio": _promedio(proyectos, "ProductividadPromedio"),
+        "tasa_exito_pruebas": _promedio(proyectos, "TasaDeExitoEnPruebas"),
         "horas_relacion": horas_relacion,
     }
 
 
+def get_kpis_by(df_proy: pd.DataFrame, df_asig: pd.DataFrame, dims: List[str], filtros: Optional[Dict] = None) -> pd.DataFrame:
+    filtros = filtros or {}
+    return calcular_kpis_por(aplicar_filtros(df_proy, filtros), aplicar_filtros_asignaciones(df_asig, filtros), dims)
+
+
+def _dimension(nombre: str) -> str:
+    # Se acepta el nombre del filtro ("anio") o la columna de cualquiera de las dos tablas ("AnioFin", "Anio")
+    for columnas in (COLUMNAS_FILTRO_PROYECTOS, COLUMNAS_FILTRO_ASIGNACIONES):
+        if nombre in columnas:
+            return nombre
+        for filtro, columna in columnas.items():
+            if columna == nombre:
+                return filtro
+    raise ValueError(f"Dimensión desconocida: {nombre}")
+
+
+def _agrupar_por(df: pd.DataFrame, valores: pd.DataFrame, dims: List[str], columnas: Dict[str, str]):
+    """Agrupador de `valores` por las dimensiones de `dims` presentes en `columnas` (None si no hay ninguna)"""
+    claves = [df[columnas[dim]].rename(dim) for dim in dims if dim in columnas]
+    if not claves:
+        return None
+    return valores.groupby(claves, dropna=False, observed=True)
+
+
+def calcular_kpis_por(proyectos: pd.DataFrame, asignaciones: pd.DataFrame, dims: List[str]) -> pd.DataFrame:
+    """
+    KPIs de calcular_kpis para cada combinación de las dimensiones dadas, con un solo groupby por tabla
+
+    Cada fila equivale a get_kpis con un filtro de un valor por dimensión: las dimensiones
+    sólo de proyectos (cliente) no afectan horas_relacion y las sólo de asignaciones (rol)
+    no afectan los KPIs de proyectos.
+
+    Args:
+        proyectos: Proyectos ya filtrados
+        asignaciones: Asignaciones ya filtradas
+        dims: Filtros ("anio", "mes", "cliente", "proyecto", "rol") o sus columnas
+            ("AnioFin", "MesFin", "CodigoClienteReal", "Rol"...)
+
+    Returns:
+        DataFrame con un índice por dimensión (nombrado como el filtro) y una columna por KPI
+    """
+    dims = list(dict.fromkeys(_dimension(dim) for dim in dims))
+    if not dims:
+        return pd.DataFrame([calcular_kpis(proyectos, asignaciones)])
+
+    por_proyecto = pd.DataFrame({
+        "cumplimiento_presupuesto": 1 - (proyectos["CosteReal"] - proyectos["Presupuesto"]) / proyectos["Presupuesto"],
+        "desviacion_presupuestal": abs(proyectos["DesviacionPresupuestal"]) / proyectos["Presupuesto"],
+        "penalizaciones_sobre_presupuesto": proyectos["PenalizacionesMonto"] / proyectos["Presupuesto"],
+        "proyectos_a_tiempo": (proyectos["RetrasoFinalDias"] <= 0).astype("float64"),
+        "proyectos_cancelados": (proyectos["Cancelado"] == 1).astype("float64"),
+        "porcentaje_tareas_retrasadas": proyectos["PorcentajeTareasRetrasadas"].astype("float64"),
+        "porcentaje_hitos_retrasados": proyectos["PorcentajeHitosRetrasados"].astype("float64"),
+        "tasa_errores": proyectos["TasaDeErroresEncontrados"].astype("float64"),
+        "productividad_promedio": proyectos["ProductividadPromedio"].astype("float64"),
+        "tasa_exito_pruebas": proyectos["TasaDeExitoEnPruebas"].astype("float64"),
+    })
+    grupos = _agrupar_por(proyectos, por_proyecto, dims, COLUMNAS_FILTRO_PROYECTOS)
+    kpis_proyectos = por_proyecto.mean().to_frame().T if grupos is None else grupos.mean().reset_index()
+
+    horas = asignaciones[["HorasReales", "HorasPlanificadas"]]
+    grupos = _agrupar_por(asignaciones, horas, dims, COLUMNAS_FILTRO_ASIGNACIONES)
+    horas = horas.sum().to_frame().T if grupos is None else grupos.sum().reset_index()
+    horas["horas_relacion"] = (horas["HorasReales"] / horas["HorasPlanificadas"]).where(horas["HorasPlanificadas"] > 0)
+    horas = horas.drop(columns=["HorasReales", "HorasPlanificadas"])
+
+    # Las combinaciones sin proyectos o sin asignaciones valen lo mismo que get_kpis sobre una tabla vacía
+    comunes = [dim for dim in dims if dim in kpis_proyectos.columns and dim in horas.columns]
+    if comunes:
+        kpis = kpis_proyectos.merge(horas, on=comunes, how="outer")
+    else:
+        kpis = kpis_proyectos.merge(horas, how="cross")
+    kpis[["proyectos_a_tiempo", "proyectos_cancelados"]] = kpis[["proyectos_a_tiempo", "proyectos_cancelados"]].fillna(0.0)
+
+    return kpis.set_index(dims).sort_index()
+
+
 def get_detail_table(df_proy: pd.DataFrame, filtros: Dict) -> pd.DataFrame:
-    proyectos = aplicar_filtros(df_proy, filtros)
+    return construir_tabla_detalle(aplicar_filtros(df_proy, filtros))
+
+
+def construir_tabla_detalle(proyectos: pd.DataFrame) -> pd.DataFrame:
+    """Tabla consolidada sobre proyectos ya filtrados"""
     columnas = [
         "CodigoClienteReal",
         "CodigoProyecto",
@@ -91,90 +229,234 @@ def get_detail_table(df_proy: pd.DataFrame, filtros: Dict) -> pd.DataFrame:
 
 
 def build_olap_views(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame, filtros: Dict):
-    proyectos = aplicar_filtros(df_proyectos, filtros)
-    asignaciones = aplicar_filtros_asignaciones(df_asignaciones, filtros)
-
-    barras_presupuesto = proyectos[["CodigoProyecto", "Presupuesto", "CosteReal"]]
-
-    # Crear evolución temporal de proyectos a tiempo
-    proyectos_a_tiempo = pd.DataFrame(columns=["Fecha", "A_Tiempo"])
-    if not proyectos.empty and "AnioFin" in proyectos.columns and "MesFin" in proyectos.columns:
-        try:
-            proyectos_temp = proyectos.copy()
-            
-            # Validar que AnioFin y MesFin son numéricos
-            proyectos_temp["AnioFin"] = pd.to_numeric(proyectos_temp["AnioFin"], errors='coerce')
-            proyectos_temp["MesFin"] = pd.to_numeric(proyectos_temp["MesFin"], errors='coerce')
-            
-            # Filtrar valores válidos (año entre 2000-2050, mes entre 1-12)
-            proyectos_temp = proyectos_temp[
-                (proyectos_temp["AnioFin"] >= 2000) & 
-                (proyectos_temp["AnioFin"] <= 2050) &
-                (proyectos_temp["MesFin"] >= 1) & 
-                (proyectos_temp["MesFin"] <= 12)
-            ]
-            
-            if not proyectos_temp.empty:
-                # Crear fecha válida
-                proyectos_temp["FechaFin"] = pd.to_datetime(
-                    proyectos_temp[["AnioFin", "MesFin"]].rename(
-                        columns={"AnioFin": "year", "MesFin": "month"}
-                    ).assign(day=1),
-                    errors='coerce'
-                )
-                
-                # Filtrar fechas válidas
-                proyectos_temp = proyectos_temp[proyectos_temp["FechaFin"].notna()]
-                
-                if not proyectos_temp.empty and "RetrasoFinalDias" in proyectos_temp.columns:
-                    # Calcular proyectos a tiempo por mes
-                    proyectos_temp["A_Tiempo"] = (proyectos_temp["RetrasoFinalDias"] <= 0).astype(int)
-                    
-                    # Agrupar por mes y calcular porcentaje de proyectos a tiempo
-                    proyectos_por_mes = (
-                        proyectos_temp.groupby(proyectos_temp["FechaFin"].dt.to_period("M"))
-                        .agg({"A_Tiempo": ["sum", "count"]})
-                        .reset_index()
-                    )
-                    proyectos_por_mes.columns = ["Periodo", "Proyectos_A_Tiempo", "Total_Proyectos"]
-                    
-                    # Calcular porcentaje
-                    proyectos_por_mes["A_Tiempo"] = (proyectos_por_mes["Proyectos_A_Tiempo"] / 
-                                                      proyectos_por_mes["Total_Proyectos"])
-                    
-                    proyectos_por_mes["Fecha"] = proyectos_por_mes["Periodo"].dt.to_timestamp()
-                    proyectos_a_tiempo = proyectos_por_mes[["Fecha", "A_Tiempo"]].sort_values("Fecha")
-        except Exception as e:
-            print(f"Error al crear proyectos_a_tiempo: {e}")
-            import traceback
-            traceback.print_exc()
-            proyectos_a_tiempo = pd.DataFrame(columns=["Fecha", "A_Tiempo"])
-
-    capex_opex = (
-        proyectos.groupby(["Categoria"])["ProporcionCAPEX_OPEX"].mean().reset_index()
-        if not proyectos.empty and "Categoria" in proyectos.columns and "ProporcionCAPEX_OPEX" in proyectos.columns
-        else pd.DataFrame(columns=["Categoria", "ProporcionCAPEX_OPEX"])
+    return vistas_desde_cubo(
+        obtener_cubo_olap(df_proyectos, df_asignaciones),
+        aplicar_filtros(df_proyectos, filtros),
+        aplicar_filtros_asignaciones(df_asignaciones, filtros),
+        filtros,
+    )
+
+
+# Grano del cubo: una celda por combinación de estas columnas (las que existan en cada tabla)
+GRANO_CUBO_PROYECTOS = ["AnioFin", "MesFin", "CodigoClienteReal", "CodigoProyecto", "Categoria"]
+GRANO_CUBO_ASIGNACIONES = ["Anio", "Mes", "CodigoProyecto", "Rol"]
+
+
+class CuboOLAP:
+    """
+    Agregados aditivos de proyectos y asignaciones al grano más fino de las dimensiones
+
+    Cada celda guarda sumas y conteos (nunca promedios), de modo que cualquier vista
+    más gruesa y cualquier combinación de filtros se obtiene sumando celdas. Las
+    celdas conservan las columnas de los filtros del sidebar y se filtran con el
+    mismo IndiceFiltros que las tablas originales.
+    """
+
+    def __init__(self, df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame):
+        self.filas = (len(df_proyectos), len(df_asignaciones))
+
+        medidas = pd.DataFrame({"Proyectos": np.ones(len(df_proyectos), dtype=np.int64)}, index=df_proyectos.index)
+        if "RetrasoFinalDias" in df_proyectos.columns:
+            medidas["ProyectosATiempo"] = (df_proyectos["RetrasoFinalDias"] <= 0).astype(np.int64)
+        if "ProporcionCAPEX_OPEX" in df_proyectos.columns:
+            capex = df_proyectos["ProporcionCAPEX_OPEX"].astype("float64")
+            medidas["CapexSuma"] = capex.fillna(0.0)
+            medidas["CapexConteo"] = capex.notna().astype(np.int64)
+        self.proyectos = self._agregar(df_proyectos, medidas, GRANO_CUBO_PROYECTOS)
+
+        horas = [col for col in ("HorasReales", "HorasPlanificadas") if col in df_asignaciones.columns]
+        self.asignaciones = self._agregar(df_asignaciones, df_asignaciones[horas], GRANO_CUBO_ASIGNACIONES)
+
+    @staticmethod
+    def _agregar(df: pd.DataFrame, medidas: pd.DataFrame, grano) -> pd.DataFrame:
+        claves = [df[col] for col in grano if col in df.columns]
+        if not claves or df.empty:
+            return pd.concat([df[[col for col in grano if col in df.columns]].iloc[:0], medidas.iloc[:0]], axis=1)
+        # NaN es un valor más de cada dimensión, igual que en IndiceFiltros
+        return medidas.groupby(claves, dropna=False, observed=True).sum().reset_index()
+
+    def proyectos_a_tiempo(self, filtros: Dict) -> pd.DataFrame:
+        """Porcentaje de proyectos a tiempo por mes de fin (Fecha, A_Tiempo)"""
+        celdas = aplicar_filtros(self.proyectos, filtros)
+        if celdas.empty or "ProyectosATiempo" not in celdas.columns or not {"AnioFin", "MesFin"} <= set(celdas.columns):
+            return pd.DataFrame(columns=["Fecha", "A_Tiempo"])
+        anio = pd.to_numeric(celdas["AnioFin"], errors="coerce")
+        mes = pd.to_numeric(celdas["MesFin"], errors="coerce")
+        # Sólo fechas válidas (año entre 2000-2050, mes entre 1-12)
+        celdas = celdas[(anio >= 2000) & (anio <= 2050) & (mes >= 1) & (mes <= 12)]
+        if celdas.empty:
+            return pd.DataFrame(columns=["Fecha", "A_Tiempo"])
+        por_mes = celdas.groupby(["AnioFin", "MesFin"])[["ProyectosATiempo", "Proyectos"]].sum().reset_index()
+        fechas = pd.PeriodIndex.from_fields(
+            year=por_mes["AnioFin"].astype(int), month=por_mes["MesFin"].astype(int), freq="M"
+        ).to_timestamp()
+        return pd.DataFrame({
+            "Fecha": fechas,
+            "A_Tiempo": por_mes["ProyectosATiempo"] / por_mes["Proyectos"],
+        }).sort_values("Fecha", ignore_index=True)
+
+    def capex_opex(self, filtros: Dict) -> pd.DataFrame:
+        """Proporción CAPEX/OPEX promedio por categoría"""
+        celdas = aplicar_filtros(self.proyectos, filtros)
+        if celdas.empty or "Categoria" not in celdas.columns or "CapexSuma" not in celdas.columns:
+            return pd.DataFrame(columns=["Categoria", "ProporcionCAPEX_OPEX"])
+        por_categoria = celdas.groupby("Categoria", observed=True)[["CapexSuma", "CapexConteo"]].sum()
+        promedio = por_categoria["CapexSuma"] / por_categoria["CapexConteo"].where(por_categoria["CapexConteo"] > 0)
+        return promedio.rename("ProporcionCAPEX_OPEX").reset_index()
+
+    def productividad_por_rol(self, filtros: Dict) -> pd.DataFrame:
+        """Horas reales y planificadas por rol"""
+        celdas = aplicar_filtros_asignaciones(self.asignaciones, filtros)
+        if celdas.empty or "Rol" not in celdas.columns:
+            return pd.DataFrame(columns=["Rol", "HorasReales", "HorasPlanificadas"])
+        return celdas.groupby("Rol", observed=True)[["HorasReales", "HorasPlanificadas"]].sum().reset_index()
+
+
+def obtener_cubo_olap(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame) -> CuboOLAP:
+    """
+    Retorna el cubo OLAP de las tablas dadas, construyéndolo una sola vez por snapshot
+
+    Args:
+        df_proyectos: Proyectos sin filtrar
+        df_asignaciones: Asignaciones sin filtrar
+
+    Returns:
+        CuboOLAP memorizado junto a df_proyectos
+    """
+    # El cubo depende de ambas tablas: se memoriza sobre proyectos y se invalida si cambian las asignaciones
+    return memo_por_frame(
+        df_proyectos, "cubo_olap", lambda _: CuboOLAP(df_proyectos, df_asignaciones), dependencias=(df_asignaciones,)
     )
 
+
+def vistas_desde_cubo(cubo: CuboOLAP, proyectos: pd.DataFrame, asignaciones: pd.DataFrame, filtros: Dict) -> Dict:
+    """
+    Vistas tipo cubo para una selección de filtros
+
+    Las vistas agregadas se obtienen sumando celdas del cubo; las vistas por fila
+    (barras, retrasos, asignaciones) se toman de las tablas ya filtradas.
+    """
     retrasos = (
         proyectos[["CodigoProyecto", "RetrasoInicioDias", "RetrasoFinalDias"]]
         if not proyectos.empty
         else pd.DataFrame(columns=["CodigoProyecto", "RetrasoInicioDias", "RetrasoFinalDias"])
     )
-    
-    productividad_por_rol = (
-        asignaciones.groupby("Rol")[["HorasReales", "HorasPlanificadas"]]
-        .sum()
-        .reset_index()
-        if not asignaciones.empty
-        else pd.DataFrame(columns=["Rol", "HorasReales", "HorasPlanificadas"])
-    )
 
     return {
-        "barras_presupuesto": barras_presupuesto,
-        "proyectos_a_tiempo": proyectos_a_tiempo,
-        "capex_opex": capex_opex,
+        "barras_presupuesto": proyectos[["CodigoProyecto", "Presupuesto", "CosteReal"]],
+        "proyectos_a_tiempo": cubo.proyectos_a_tiempo(filtros),
+        "capex_opex": cubo.capex_opex(filtros),
         "retrasos": retrasos,
-        "productividad_por_rol": productividad_por_rol,
+        "productividad_por_rol": cubo.productividad_por_rol(filtros),
         "asignaciones": asignaciones,
     }
+
+
+def construir_vistas_olap(proyectos: pd.DataFrame, asignaciones: pd.DataFrame) -> Dict:
+    """Vistas tipo cubo sobre proyectos y asignaciones ya filtrados"""
+    return vistas_desde_cubo(CuboOLAP(proyectos, asignaciones), proyectos, asignaciones, {})
+
+
+def normalizar_filtros(filtros: Dict) -> Tuple:
+    """
+    Convierte el diccionario de filtros en una clave hashable y canónica
+    (sin filtros vacíos, valores ordenados y como tipos nativos de Python)
+    """
+    clave = []
+    for nombre, valores in sorted(filtros.items()):
+        if valores:
+            nativos = [v.item() if isinstance(v, np.generic) else v for v in valores]
+            clave.append((nombre, tuple(sorted(set(nativos), key=str))))
+    return tuple(clave)
+
+
+class ContextoAnalitico:
+    """
+    Resultados analíticos de una selección de filtros, calculados una sola vez y bajo demanda
+
+    Todas las vistas de una ejecución reciben el mismo contexto, de modo que los
+    DataFrames filtrados, los KPIs y las vistas OLAP se calculan como máximo una
+    vez. Los resultados se comparten entre vistas y sesiones: no deben modificarse.
+    """
+
+    def __init__(self, df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame, filtros: Dict):
+        self.df_proyectos = df_proyectos
+        self.df_asignaciones = df_asignaciones
+        self.filtros = filtros
+        self._resultados = {}
+        self._lock = threading.RLock()
+
+    def _calcular(self, nombre: str, funcion):
+        with self._lock:
+            if nombre not in self._resultados:
+                self._resultados[nombre] = funcion()
+            return self._resultados[nombre]
+
+    @property
+    def proyectos(self) -> pd.DataFrame:
+        return self._calcular("proyectos", lambda: aplicar_filtros(self.df_proyectos, self.filtros))
+
+    @property
+    def asignaciones(self) -> pd.DataFrame:
+        return self._calcular(
+            "asignaciones", lambda: aplicar_filtros_asignaciones(self.df_asignaciones, self.filtros)
+        )
+
+    @property
+    def kpis(self) -> Dict:
+        return self._calcular("kpis", lambda: calcular_kpis(self.proyectos, self.asignaciones))
+
+    @property
+    def vistas(self) -> Dict:
+        return self._calcular(
+            "vistas",
+            lambda: vistas_desde_cubo(
+                obtener_cubo_olap(self.df_proyectos, self.df_asignaciones),
+                self.proyectos,
+                self.asignaciones,
+                self.filtros,
+            ),
+        )
+
+    @property
+    def detalle(self) -> pd.DataFrame:
+        return self._calcular("detalle", lambda: construir_tabla_detalle(self.proyectos))
+
+    def kpis_por(self, dims: List[str]) -> pd.DataFrame:
+        """KPIs por combinación de dimensiones (ver calcular_kpis_por)"""
+        return self._calcular(
+            ("kpis_por", tuple(dims)), lambda: calcular_kpis_por(self.proyectos, self.asignaciones, dims)
+        )
+
+
+# Contextos recientes, compartidos entre ejecuciones y sesiones (LRU)
+MAX_CONTEXTOS = 32
+_contextos: "OrderedDict[tuple, ContextoAnalitico]" = OrderedDict()
+_contextos_lock = threading.Lock()
+
+
+def obtener_contexto(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame, filtros: Dict) -> ContextoAnalitico:
+    """
+    Retorna el contexto analítico para los datos y filtros dados, reutilizando uno reciente si existe
+
+    Args:
+        df_proyectos: Proyectos sin filtrar
+        df_asignaciones: Asignaciones sin filtrar
+        filtros: Selección del sidebar
+
+    Returns:
+        ContextoAnalitico (nuevo o tomado del LRU)
+    """
+    # Los DataFrames se identifican por objeto: todas las sesiones reciben los mismos (snapshot o
+    # caché de filtros SQL) y el contexto los retiene, así su id no se reutiliza mientras esté en el LRU
+    clave = (id(df_proyectos), id(df_asignaciones), normalizar_filtros(filtros))
+    with _contextos_lock:
+        contexto = _contextos.get(clave)
+        if contexto is not None:
+            _contextos.move_to_end(clave)
+            return contexto
+        contexto = ContextoAnalitico(df_proyectos, df_asignaciones, filtros)
+        _contextos[clave] = contexto
+        if len(_contextos) > MAX_CONTEXTOS:
+            _contextos.popitem(last=False)
+        return contexto
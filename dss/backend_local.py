@@ -0,0 +1,72 @@
+"""
+Backend local del Data Warehouse sobre SQLite en memoria
+
+Carga los CSV de CargaDatos/*_seed.csv (mismo esquema que TiDB) para que las
+mismas queries de data_sources.py y metricas_calculadas.py se ejecuten sin red.
+Se activa con DW_BACKEND=seed en el archivo .env.
+"""
+import itertools
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+import streamlit as st
+
+SEED_DIR = Path(__file__).parent.parent / "CargaDatos"
+SUFIJO_SEED = "_seed.csv"
+
+_contador = itertools.count()
+
+
+class SeedBackend:
+    """Base SQLite en memoria compartida entre hilos, cargada desde los CSV semilla"""
+
+    def __init__(self, directorio: Path = SEED_DIR):
+        # Cada hilo abre su propia conexión a la misma base en memoria (cache compartida);
+        # la conexión ancla mantiene viva la base mientras exista el backend
+        self._uri = f"file:dss_seed_{next(_contador)}?mode=memory&cache=shared"
+        self._ancla = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        self._local = threading.local()
+        self.tablas = self._cargar_csv(Path(directorio))
+
+    def _cargar_csv(self, directorio: Path) -> List[str]:
+        tablas = []
+        for archivo in sorted(directorio.glob(f"*{SUFIJO_SEED}")):
+            tabla = archivo.name[: -len(SUFIJO_SEED)]
+            df = pd.read_csv(archivo)
+            df.to_sql(tabla, self._ancla, index=False, if_exists="replace")
+            # Índices sobre claves primarias y foráneas (columnas ID_*) para los JOINs
+            for columna in df.columns:
+                if columna.startswith("ID_"):
+                    self._ancla.execute(f'CREATE INDEX "ix_{tabla}_{columna}" ON "{tabla}" ("{columna}")')
+            tablas.append(tabla)
+        self._ancla.commit()
+        return tablas
+
+    def _conexion(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._uri, uri=True)
+            self._local.conn = conn
+        return conn
+
+    def ejecutar(self, query: str, params: Optional[tuple] = None) -> pd.DataFrame:
+        """
+        Ejecuta una query con sintaxis pymysql (marcadores %s) sobre la base local
+
+        Args:
+            query: Query SQL a ejecutar
+            params: Parámetros para la query (opcional)
+
+        Returns:
+            DataFrame con columnas ya tipadas por SQLite
+        """
+        return pd.read_sql_query(query.replace("%s", "?"), self._conexion(), params=params)
+
+
+@st.cache_resource
+def get_seed_backend() -> SeedBackend:
+    """Retorna el backend local compartido por todas las sesiones"""
+    return SeedBackend()
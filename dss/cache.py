@@ -0,0 +1,59 @@
+"""
+Memorización de estructuras derivadas de un DataFrame (índices, árboles, cubos)
+
+Cada estructura se construye una sola vez por DataFrame y se descarta
+automáticamente cuando ese DataFrame se libera de memoria.
+"""
+import threading
+import weakref
+from typing import Callable, Dict, Sequence, Tuple
+
+import pandas as pd
+
+_memo: Dict[Tuple[int, str], tuple] = {}
+_lock = threading.Lock()
+
+
+def memo_por_frame(
+    df: pd.DataFrame,
+    nombre: str,
+    constructor: Callable[[pd.DataFrame], object],
+    dependencias: Sequence[pd.DataFrame] = (),
+):
+    """
+    Retorna la estructura `nombre` derivada de `df`, construyéndola sólo la primera vez
+
+    Args:
+        df: DataFrame de origen (se asume que no se modifica después de indexarlo)
+        nombre: Identificador de la estructura
+        constructor: Función que recibe `df` y construye la estructura
+        dependencias: Otros DataFrames de los que depende la estructura; se reconstruye
+            si alguno no es el mismo objeto que cuando se construyó
+
+    Returns:
+        Estructura memorizada
+    """
+    clave = (id(df), nombre)
+    with _lock:
+        entrada = _memo.get(clave)
+    if (
+        entrada is not None
+        and _vigente(entrada[0], df)
+        and len(entrada[1]) == len(dependencias)
+        and all(_vigente(guardada, dependencia) for guardada, dependencia in zip(entrada[1], dependencias))
+    ):
+        return entrada[2]
+
+    valor = constructor(df)
+    referencia = weakref.ref(df, lambda _, clave=clave: _memo.pop(clave, None))
+    # Las dependencias se guardan con referencias débiles: el memo no las mantiene vivas
+    guardadas = tuple((weakref.ref(dependencia), len(dependencia)) for dependencia in dependencias)
+    with _lock:
+        _memo[clave] = ((referencia, len(df)), guardadas, valor)
+    return valor
+
+
+def _vigente(guardada: tuple, df: pd.DataFrame) -> bool:
+    # Misma identidad (la referencia sigue viva y apunta a `df`) y misma cantidad de filas
+    referencia, filas = guardada
+    return referencia() is df and filas == len(df)
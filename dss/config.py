@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 
 # URL de conexión directa (formato que funciona)
 DATABASE_URL = os.getenv(
@@ -14,6 +15,34 @@ DB_CONFIG = {
     "database": os.getenv("DB_NAME", "dw_proyectos"),
 }
 
+# Directorio de snapshots Parquet del Data Warehouse (ver dss/snapshots.py)
+SNAPSHOT_DIR = os.getenv(
+    "DSS_SNAPSHOT_DIR",
+    str(Path(__file__).resolve().parent.parent / ".snapshots")
+)
+
+# Directorio del registro de modelos entrenados (ver dss/registro_modelos.py)
+MODELOS_DIR = os.getenv(
+    "DSS_MODELOS_DIR",
+    str(Path(__file__).resolve().parent.parent / ".modelos")
+)
+
+# Segundos que se reutiliza el snapshot del DWH antes de revisar marcas de agua (ver dss/warehouse.py)
+WAREHOUSE_TTL = int(os.getenv("DSS_WAREHOUSE_TTL", 300))
+
+# Traducir los filtros del sidebar a WHERE en SQL en lugar de cargar todo el DWH (ver dss/data_sources.py)
+FILTROS_SQL = os.getenv("DSS_FILTROS_SQL", "false").lower() == "true"
+
+# Segundos entre consultas de filas nuevas para las métricas incrementales (ver dss/metricas_incrementales.py)
+METRICAS_INTERVALO = float(os.getenv("DSS_METRICAS_INTERVALO", 5))
+
+# Servicio HTTP de predicción (ver dss/servicio.py): interfaz, puerto, espera máxima (ms) y tamaño máximo de cada lote
+# (sólo escucha en localhost salvo que DSS_SERVICIO_HOST indique otra interfaz, p. ej. 0.0.0.0)
+SERVICIO_HOST = os.getenv("DSS_SERVICIO_HOST", "127.0.0.1")
+SERVICIO_PUERTO = int(os.getenv("DSS_SERVICIO_PUERTO", 8600))
+SERVICIO_LOTE_MS = float(os.getenv("DSS_SERVICIO_LOTE_MS", 5))
+SERVICIO_LOTE_MAX = int(os.getenv("DSS_SERVICIO_LOTE_MAX", 4096))
+
 KPI_TARGETS = {
     # Métricas de Tiempo
     "retraso_inicio_dias": 0,  # Target: 0 días de retraso en inicio
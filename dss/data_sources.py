@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Dict, Tuple
 
 import numpy as np
 import pandas as pd
@@ -6,6 +6,17 @@ import streamlit as st
 
 # Importar configuración de base de datos
 from .db_config import execute_query, test_connection
+from .analytics import normalizar_filtros
+from .config import WAREHOUSE_TTL
+from .warehouse import (
+    COLUMNAS_NUMERICAS_PROYECTOS,
+    COLUMNAS_PORCENTAJE,
+    aplicar_esquema,
+    cargar_warehouse,
+    convertir_numericos,
+    porcentajes_a_decimal,
+    solo_lectura,
+)
 
 
 def generar_datos_de_ejemplo() -> Tuple[pd.DataFrame, pd.DataFrame]:
@@ -59,74 +70,71 @@ def generar_datos_de_ejemplo() -> Tuple[pd.DataFrame, pd.DataFrame]:
     return proyectos, asignaciones
 
 
-@st.cache_data(show_spinner=False)
+# Query con JOINs para combinar hechos y dimensiones de proyectos
+QUERY_PROYECTOS = """
+SELECT 
+    hp.ID_Proyecto,
+    dp.CodigoProyecto,
+    dp.Version,
+    dp.Cancelado,
+    dp.TotalErrores,
+    dp.NumTrabajadores,
+    dc.CodigoClienteReal,
+    dg.TipoGasto,
+    dg.Categoria,
+    hp.Presupuesto,
+    hp.CosteReal,
+    hp.DesviacionPresupuestal,
+    hp.PenalizacionesMonto,
+    hp.ProporcionCAPEX_OPEX,
+    hp.RetrasoInicioDias,
+    hp.RetrasoFinalDias,
+    hp.TasaDeErroresEncontrados,
+    hp.TasaDeExitoEnPruebas,
+    hp.ProductividadPromedio,
+    hp.PorcentajeTareasRetrasadas,
+    hp.PorcentajeHitosRetrasados,
+    dt_inicio.Anio as AnioInicio,
+    dt_inicio.Mes as MesInicio,
+    dt_fin.Anio as AnioFin,
+    dt_fin.Mes as MesFin
+FROM hechos_proyectos hp
+LEFT JOIN dim_proyectos dp ON hp.ID_Proyecto = dp.ID_Proyecto
+LEFT JOIN dim_clientes dc ON dp.ID_Cliente = dc.ID_Cliente
+LEFT JOIN dim_gastos dg ON hp.ID_Gasto = dg.ID_Finanza
+LEFT JOIN dim_tiempo dt_inicio ON hp.ID_FechaInicio = dt_inicio.ID_Tiempo
+LEFT JOIN dim_tiempo dt_fin ON hp.ID_FechaFin = dt_fin.ID_Tiempo
+"""
+
+# Query con JOINs para combinar hechos y dimensiones de asignaciones
+QUERY_ASIGNACIONES = """
+SELECT 
+    ha.ID_Empleado,
+    de.CodigoEmpleado,
+    de.Rol,
+    de.Seniority,
+    ha.ID_Proyecto,
+    dp.CodigoProyecto,
+    ha.HorasPlanificadas,
+    ha.HorasReales,
+    ha.ValorHoras,
+    ha.RetrasoHoras,
+    dt.Anio,
+    dt.Mes
+FROM hechos_asignaciones ha
+LEFT JOIN dim_empleados de ON ha.ID_Empleado = de.ID_Empleado
+LEFT JOIN dim_proyectos dp ON ha.ID_Proyecto = dp.ID_Proyecto
+LEFT JOIN dim_tiempo dt ON ha.ID_FechaAsignacion = dt.ID_Tiempo
+"""
+
 def cargar_df_proyectos() -> pd.DataFrame:
     """
     Carga datos de proyectos desde la base de datos TiDB Cloud
-    Ejecuta query con JOINs para combinar hechos y dimensiones
+    Se deriva del snapshot compartido del DWH (JOINs de QUERY_PROYECTOS en memoria);
+    todas las sesiones reciben el mismo DataFrame, de sólo lectura
     """
     try:
-        query = """
-        SELECT 
-            hp.ID_Proyecto,
-            dp.CodigoProyecto,
-            dp.Version,
-            dp.Cancelado,
-            dp.TotalErrores,
-            dp.NumTrabajadores,
-            dc.CodigoClienteReal,
-            dg.TipoGasto,
-            dg.Categoria,
-            hp.Presupuesto,
-            hp.CosteReal,
-            hp.DesviacionPresupuestal,
-            hp.PenalizacionesMonto,
-            hp.ProporcionCAPEX_OPEX,
-            hp.RetrasoInicioDias,
-            hp.RetrasoFinalDias,
-            hp.TasaDeErroresEncontrados,
-            hp.TasaDeExitoEnPruebas,
-            hp.ProductividadPromedio,
-            hp.PorcentajeTareasRetrasadas,
-            hp.PorcentajeHitosRetrasados,
-            dt_inicio.Anio as AnioInicio,
-            dt_inicio.Mes as MesInicio,
-            dt_fin.Anio as AnioFin,
-            dt_fin.Mes as MesFin
-        FROM hechos_proyectos hp
-        LEFT JOIN dim_proyectos dp ON hp.ID_Proyecto = dp.ID_Proyecto
-        LEFT JOIN dim_clientes dc ON dp.ID_Cliente = dc.ID_Cliente
-        LEFT JOIN dim_gastos dg ON hp.ID_Gasto = dg.ID_Finanza
-        LEFT JOIN dim_tiempo dt_inicio ON hp.ID_FechaInicio = dt_inicio.ID_Tiempo
-        LEFT JOIN dim_tiempo dt_fin ON hp.ID_FechaFin = dt_fin.ID_Tiempo
-        """
-        
-        df = execute_query(query)
-        
-        # Convertir columnas numéricas (vienen como strings desde la BD)
-        numeric_columns = [
-            "Version", "Cancelado", "TotalErrores", "NumTrabajadores",
-            "Presupuesto", "CosteReal", "DesviacionPresupuestal", "PenalizacionesMonto",
-            "ProporcionCAPEX_OPEX", "RetrasoInicioDias", "RetrasoFinalDias",
-            "TasaDeErroresEncontrados", "TasaDeExitoEnPruebas", "ProductividadPromedio",
-            "PorcentajeTareasRetrasadas", "PorcentajeHitosRetrasados",
-            "AnioInicio", "MesInicio", "AnioFin", "MesFin"
-        ]
-        
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Convertir porcentajes a decimal (0-1) si están en formato 0-100
-        for col in ["TasaDeErroresEncontrados", "TasaDeExitoEnPruebas", 
-                    "PorcentajeTareasRetrasadas", "PorcentajeHitosRetrasados"]:
-            if col in df.columns:
-                # Si los valores son > 1, convertir de 0-100 a 0-1
-                max_val = df[col].max()
-                if not pd.isna(max_val) and max_val > 1:
-                    df[col] = df[col] / 100
-        
-        return df
+        return cargar_warehouse().proyectos
         
     except Exception as e:
         st.error(f"Error cargando datos de proyectos desde BD: {str(e)}")
@@ -134,48 +142,147 @@ def cargar_df_proyectos() -> pd.DataFrame:
         return generar_datos_de_ejemplo()[0]
 
 
-@st.cache_data(show_spinner=False)
 def cargar_df_asignaciones() -> pd.DataFrame:
     """
     Carga datos de asignaciones desde la base de datos TiDB Cloud
-    Ejecuta query con JOINs para combinar hechos y dimensiones
+    Se deriva del snapshot compartido del DWH (JOINs de QUERY_ASIGNACIONES en memoria);
+    todas las sesiones reciben el mismo DataFrame, de sólo lectura
     """
     try:
-        query = """
-        SELECT 
-            ha.ID_Empleado,
-            de.CodigoEmpleado,
-            de.Rol,
-            de.Seniority,
-            ha.ID_Proyecto,
-            dp.CodigoProyecto,
-            ha.HorasPlanificadas,
-            ha.HorasReales,
-            ha.ValorHoras,
-            ha.RetrasoHoras,
-            dt.Anio,
-            dt.Mes
-        FROM hechos_asignaciones ha
-        LEFT JOIN dim_empleados de ON ha.ID_Empleado = de.ID_Empleado
-        LEFT JOIN dim_proyectos dp ON ha.ID_Proyecto = dp.ID_Proyecto
-        LEFT JOIN dim_tiempo dt ON ha.ID_FechaAsignacion = dt.ID_Tiempo
-        """
-        
-        df = execute_query(query)
-        
-        # Convertir columnas numéricas
-        numeric_columns = [
-            "HorasPlanificadas", "HorasReales", "ValorHoras", 
-            "RetrasoHoras", "Anio", "Mes"
-        ]
-        
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        return df
+        return cargar_warehouse().asignaciones
         
     except Exception as e:
         st.error(f"Error cargando datos de asignaciones desde BD: {str(e)}")
         # Fallback a datos de ejemplo
         return generar_datos_de_ejemplo()[1]
+
+
+# Columna SQL a la que se traduce cada filtro del sidebar en cada query
+FILTROS_SQL_PROYECTOS = {
+    "anio": "dt_fin.Anio",
+    "mes": "dt_fin.Mes",
+    "cliente": "dc.CodigoClienteReal",
+    "proyecto": "dp.CodigoProyecto",
+}
+FILTROS_SQL_ASIGNACIONES = {
+    "anio": "dt.Anio",
+    "mes": "dt.Mes",
+    "proyecto": "dp.CodigoProyecto",
+    "rol": "de.Rol",
+}
+
+QUERY_OPCIONES_PROYECTOS = """
+SELECT DISTINCT
+    dt_fin.Anio as AnioFin,
+    dt_fin.Mes as MesFin,
+    dc.CodigoClienteReal,
+    dp.CodigoProyecto
+FROM hechos_proyectos hp
+LEFT JOIN dim_proyectos dp ON hp.ID_Proyecto = dp.ID_Proyecto
+LEFT JOIN dim_clientes dc ON dp.ID_Cliente = dc.ID_Cliente
+LEFT JOIN dim_tiempo dt_fin ON hp.ID_FechaFin = dt_fin.ID_Tiempo
+"""
+
+QUERY_OPCIONES_ROLES = """
+SELECT DISTINCT de.Rol
+FROM hechos_asignaciones ha
+LEFT JOIN dim_empleados de ON ha.ID_Empleado = de.ID_Empleado
+"""
+
+
+def construir_where(clave_filtros: Tuple, columnas_sql: Dict[str, str]) -> Tuple[str, tuple]:
+    """
+    Compila filtros normalizados en una cláusula WHERE parametrizada
+
+    Args:
+        clave_filtros: Resultado de normalizar_filtros
+        columnas_sql: Columna SQL para cada nombre de filtro (los demás se ignoran)
+
+    Returns:
+        Tupla (cláusula WHERE o cadena vacía, parámetros)
+    """
+    condiciones = []
+    params = []
+    for nombre, valores in clave_filtros:
+        if nombre in columnas_sql:
+            marcadores = ", ".join(["%s"] * len(valores))
+            condiciones.append(f"{columnas_sql[nombre]} IN ({marcadores})")
+            params.extend(valores)
+    if not condiciones:
+        return "", ()
+    return "WHERE " + " AND ".join(condiciones), tuple(params)
+
+
+@st.cache_data(show_spinner=False, ttl=WAREHOUSE_TTL)
+def _maximos_porcentajes() -> Dict[str, float]:
+    # La escala (0-1 o 0-100) se decide sobre la tabla completa, no sobre el subconjunto filtrado
+    columnas = ", ".join(f"MAX({col}) AS {col}" for col in COLUMNAS_PORCENTAJE)
+    df = execute_query(f"SELECT {columnas} FROM hechos_proyectos")
+    return {col: pd.to_numeric(df[col], errors="coerce").iloc[0] for col in COLUMNAS_PORCENTAJE}
+
+
+@st.cache_resource(show_spinner=False, ttl=WAREHOUSE_TTL, max_entries=64)
+def _cargar_proyectos_filtrados(clave_filtros: Tuple) -> pd.DataFrame:
+    where, params = construir_where(clave_filtros, FILTROS_SQL_PROYECTOS)
+    df = execute_query(f"{QUERY_PROYECTOS} {where}", params or None, columnar=True)
+    convertir_numericos(df, COLUMNAS_NUMERICAS_PROYECTOS)
+    return solo_lectura(aplicar_esquema(porcentajes_a_decimal(df, _maximos_porcentajes())))
+
+
+@st.cache_resource(show_spinner=False, ttl=WAREHOUSE_TTL, max_entries=64)
+def _cargar_asignaciones_filtradas(clave_filtros: Tuple) -> pd.DataFrame:
+    where, params = construir_where(clave_filtros, FILTROS_SQL_ASIGNACIONES)
+    df = execute_query(f"{QUERY_ASIGNACIONES} {where}", params or None, columnar=True)
+    convertir_numericos(df, ["HorasPlanificadas", "HorasReales", "ValorHoras", "RetrasoHoras", "Anio", "Mes"])
+    return solo_lectura(aplicar_esquema(df))
+
+
+def cargar_df_proyectos_filtrado(filtros: Dict) -> pd.DataFrame:
+    """
+    Carga sólo los proyectos que cumplen los filtros del sidebar (WHERE en SQL)
+    Resultado en caché por combinación normalizada de filtros, compartido (sólo lectura) entre sesiones
+    """
+    try:
+        return _cargar_proyectos_filtrados(normalizar_filtros(filtros))
+    except Exception as e:
+        st.error(f"Error cargando proyectos filtrados desde BD: {str(e)}")
+        return cargar_df_proyectos()
+
+
+def cargar_df_asignaciones_filtrado(filtros: Dict) -> pd.DataFrame:
+    """
+    Carga sólo las asignaciones que cumplen los filtros del sidebar (WHERE en SQL)
+    Resultado en caché por combinación normalizada de filtros, compartido (sólo lectura) entre sesiones
+    """
+    try:
+        return _cargar_asignaciones_filtradas(normalizar_filtros(filtros))
+    except Exception as e:
+        st.error(f"Error cargando asignaciones filtradas desde BD: {str(e)}")
+        return cargar_df_asignaciones()
+
+
+@st.cache_data(show_spinner=False, ttl=WAREHOUSE_TTL)
+def cargar_opciones_filtros() -> Dict[str, list]:
+    """
+    Obtiene los valores disponibles para cada filtro del sidebar con queries DISTINCT
+    """
+    try:
+        proyectos = convertir_numericos(
+            execute_query(QUERY_OPCIONES_PROYECTOS, columnar=True), ["AnioFin", "MesFin"]
+        )
+        roles = execute_query(QUERY_OPCIONES_ROLES, columnar=True)
+    except Exception as e:
+        st.error(f"Error cargando opciones de filtros desde BD: {str(e)}")
+        return opciones_filtros(cargar_df_proyectos(), cargar_df_asignaciones())
+    return opciones_filtros(proyectos, roles)
+
+
+def opciones_filtros(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame) -> Dict[str, list]:
+    """Valores ordenados disponibles para cada filtro del sidebar"""
+    return {
+        "anio": sorted(df_proyectos["AnioFin"].dropna().unique()),
+        "mes": sorted(df_proyectos["MesFin"].dropna().unique()),
+        "cliente": sorted(df_proyectos["CodigoClienteReal"].dropna().unique()),
+        "proyecto": sorted(df_proyectos["CodigoProyecto"].dropna().unique()),
+        "rol": sorted(df_asignaciones["Rol"].dropna().unique()),
+    }
@@ -2,15 +2,25 @@
 Configuración y gestión de conexión a la base de datos TiDB Cloud
 """
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
 import pymysql
 import pandas as pd
+from pymysql.constants import FIELD_TYPE
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Callable, Optional
 import streamlit as st
 
+from .backend_local import get_seed_backend
+
 # Cargar variables de entorno
 load_dotenv()
 
+BACKEND_SEED = "seed"
+
 class DatabaseConfig:
     """Configuración de conexión a TiDB Cloud"""
     
@@ -21,6 +31,14 @@ class DatabaseConfig:
         self.password = os.getenv("DW_PASS")
         self.database = os.getenv("DW_DB")
         self.ssl = os.getenv("DW_SSL", "true").lower() == "true"
+        # Backend de datos: "tidb" (TiDB Cloud) o "seed" (SQLite local con CargaDatos/*_seed.csv)
+        self.backend = os.getenv("DW_BACKEND", "tidb").lower()
+        # Pool de conexiones
+        self.pool_size = int(os.getenv("DW_POOL_SIZE", 5))
+        self.pool_timeout = float(os.getenv("DW_POOL_TIMEOUT", 10))
+        self.pool_ping = float(os.getenv("DW_POOL_PING", 30))
+        # Tablas que se cargan en paralelo (nunca más que conexiones en el pool)
+        self.max_concurrencia = min(int(os.getenv("DW_MAX_CONCURRENCIA", 4)), self.pool_size)
     
     def validate(self) -> bool:
         """Valida que todas las credenciales estén presentes"""
@@ -28,11 +46,10 @@ class DatabaseConfig:
         return all(required)
 
 
-@st.cache_resource
 def get_database_connection():
     """
-    Crea y retorna una conexión a TiDB Cloud
-    Usa caché de Streamlit para mantener la conexión activa
+    Crea y retorna una conexión nueva a TiDB Cloud
+    El llamador es responsable de cerrarla; la app usa el pool (ver get_connection_pool)
     """
     config = DatabaseConfig()
     
@@ -49,6 +66,9 @@ def get_database_connection():
             ssl={'ssl': config.ssl} if config.ssl else None,
             charset='utf8mb4',
             cursorclass=pymysql.cursors.DictCursor,
+            # Sin autocommit el primer SELECT abre una transacción REPEATABLE READ que el pool
+            # conservaría entre checkouts, y cada consulta posterior leería el mismo snapshot viejo
+            autocommit=True,
             connect_timeout=10,
             read_timeout=30,
             write_timeout=30
@@ -58,21 +78,217 @@ def get_database_connection():
         raise ConnectionError(f"Error conectando a TiDB Cloud: {str(e)}")
 
 
-def execute_query(query: str, params: Optional[tuple] = None) -> pd.DataFrame:
+# Códigos de cliente MySQL que indican socket perdido (la conexión ya no es reutilizable)
+ERRORES_DE_RED = {2003, 2006, 2013, 2055}
+
+
+def es_error_de_red(exc: Exception) -> bool:
+    """Indica si la excepción corresponde a una conexión caída y no a un error de SQL"""
+    if isinstance(exc, pymysql.err.InterfaceError):
+        return True
+    return isinstance(exc, pymysql.err.OperationalError) and bool(exc.args) and exc.args[0] in ERRORES_DE_RED
+
+
+class PoolTimeoutError(ConnectionError):
+    """No se obtuvo una conexión libre del pool dentro del tiempo de espera"""
+
+
+class ConnectionPool:
+    """
+    Pool acotado de conexiones pymysql hacia TiDB Cloud
+    
+    Cada checkout entrega una conexión exclusiva (nunca compartida entre sesiones).
+    Las conexiones ociosas más de `ping_interval` segundos se verifican con ping
+    antes de entregarse y se reemplazan si el socket quedó inválido.
+    """
+    
+    def __init__(self, max_size: int = 5, timeout: float = 10.0, ping_interval: float = 30.0,
+                 connection_factory: Callable = get_database_connection):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._factory = connection_factory
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._libres = deque()  # (conexion, instante de devolución)
+        self._abiertas = 0
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "conexiones_creadas": 0,
+            "reconexiones": 0,
+            "descartadas": 0,
+        }
+    
+    def checkout(self, timeout: Optional[float] = None):
+        """
+        Obtiene una conexión del pool
+        
+        Args:
+            timeout: Segundos máximos de espera (por defecto el del pool)
+        
+        Returns:
+            Conexión pymysql lista para usarse
+        """
+        espera = self.timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=espera):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeoutError(
+                f"Sin conexiones libres tras {espera:.1f}s (máximo {self.max_size})"
+            )
+        
+        try:
+            conn = self._tomar_libre()
+            if conn is None:
+                conn = self._crear()
+        except Exception:
+            self._slots.release()
+            raise
+        
+        with self._lock:
+            self._stats["checkouts"] += 1
+        return conn
+    
+    def checkin(self, conn, descartar: bool = False):
+        """
+        Devuelve una conexión al pool
+        
+        Args:
+            conn: Conexión obtenida con checkout
+            descartar: Cerrarla en lugar de reutilizarla (p.ej. tras un error de red)
+        """
+        try:
+            if descartar or not conn.open:
+                self._cerrar(conn)
+            else:
+                with self._lock:
+                    self._libres.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+    
+    @contextmanager
+    def conexion(self, timeout: Optional[float] = None):
+        """Context manager de checkout/checkin; descarta la conexión ante errores de red"""
+        conn = self.checkout(timeout)
+        descartar = False
+        try:
+            yield conn
+        except Exception as e:
+            descartar = es_error_de_red(e)
+            raise
+        finally:
+            self.checkin(conn, descartar=descartar)
+    
+    def estadisticas(self) -> dict:
+        """Retorna el estado actual del pool y contadores acumulados"""
+        with self._lock:
+            libres = len(self._libres)
+            return {
+                "max_size": self.max_size,
+                "abiertas": self._abiertas,
+                "en_uso": self._abiertas - libres,
+                "libres": libres,
+                **self._stats,
+            }
+    
+    def cerrar(self):
+        """Cierra todas las conexiones ociosas"""
+        with self._lock:
+            libres = list(self._libres)
+            self._libres.clear()
+        for conn, _ in libres:
+            self._cerrar(conn)
+    
+    def _tomar_libre(self):
+        # LIFO: la conexión usada más recientemente es la que menos probablemente expiró
+        while True:
+            with self._lock:
+                if not self._libres:
+                    return None
+                conn, devuelta = self._libres.pop()
+            
+            if time.monotonic() - devuelta < self.ping_interval:
+                return conn
+            try:
+                conn.ping(reconnect=False)
+                return conn
+            except Exception:
+                self._cerrar(conn)
+                with self._lock:
+                    self._stats["reconexiones"] += 1
+    
+    def _crear(self):
+        conn = self._factory()
+        with self._lock:
+            self._abiertas += 1
+            self._stats["conexiones_creadas"] += 1
+        return conn
+    
+    def _cerrar(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._abiertas -= 1
+            self._stats["descartadas"] += 1
+
+
+@st.cache_resource
+def get_connection_pool() -> ConnectionPool:
+    """
+    Retorna el pool de conexiones compartido por todas las sesiones de Streamlit
+    """
+    config = DatabaseConfig()
+    return ConnectionPool(
+        max_size=config.pool_size,
+        timeout=config.pool_timeout,
+        ping_interval=config.pool_ping,
+    )
+
+
+def obtener_estadisticas_pool() -> dict:
+    """
+    Retorna las estadísticas del pool de conexiones (abiertas, en uso, timeouts, etc.)
+    """
+    return get_connection_pool().estadisticas()
+
+
+def execute_query(query: str, params: Optional[tuple] = None, columnar: bool = False) -> pd.DataFrame:
     """
     Ejecuta una query SQL y retorna los resultados como DataFrame
     
     Args:
         query: Query SQL a ejecutar
         params: Parámetros para la query (opcional)
+        columnar: Leer por lotes de tuplas directo a columnas NumPy tipadas,
+            sin construir un dict por fila (recomendado para tablas grandes)
     
     Returns:
         DataFrame con los resultados
+    
+    Raises:
+        Exception: Los errores de conexión o SQL se propagan; reportarlos (o no) queda a cargo del llamador
     """
+    ejecutar = _ejecutar_columnar if columnar else _ejecutar
+    if DatabaseConfig().backend == BACKEND_SEED:
+        return get_seed_backend().ejecutar(query, params)
+    
+    pool = get_connection_pool()
     try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        
+        with pool.conexion() as conn:
+            return ejecutar(conn, query, params)
+    except Exception as e:
+        if not es_error_de_red(e):
+            raise
+        # Socket caído a mitad de la query: el pool ya descartó la conexión, reintentar una vez
+        with pool.conexion() as conn:
+            return ejecutar(conn, query, params)
+
+
+def _ejecutar(conn, query: str, params: Optional[tuple]) -> pd.DataFrame:
+    with conn.cursor() as cursor:
         # Ejecutar query
         if params:
             cursor.execute(query, params)
@@ -84,18 +300,76 @@ def execute_query(query: str, params: Optional[tuple] = None) -> pd.DataFrame:
         
         # Convertir a DataFrame
         if rows:
-            df = pd.DataFrame(rows)
+            return pd.DataFrame(rows)
+        # Si no hay resultados, crear DataFrame vacío con las columnas correctas
+        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        return pd.DataFrame(columns=columns)
+
+
+# Tipos MySQL que se leen directamente como columnas NumPy numéricas
+TIPOS_ENTEROS = {
+    FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.LONG,
+    FIELD_TYPE.LONGLONG, FIELD_TYPE.INT24, FIELD_TYPE.YEAR,
+}
+TIPOS_REALES = {
+    FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL, FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE,
+}
+
+# Filas por lote en la lectura columnar
+TAMANO_LOTE = 5000
+
+
+def _dtype_columna(type_code) -> Optional[type]:
+    if type_code in TIPOS_ENTEROS:
+        return np.int64
+    if type_code in TIPOS_REALES:
+        return np.float64
+    return None
+
+
+def _lote_a_array(valores: tuple, dtype: Optional[type]) -> np.ndarray:
+    if dtype is np.int64:
+        try:
+            return np.array(valores, dtype=np.int64)
+        except TypeError:
+            # Hay NULLs en el lote: la columna se promueve a float64 con NaN
+            return np.array(valores, dtype=np.float64)
+    if dtype is np.float64:
+        return np.array(valores, dtype=np.float64)
+    arr = np.empty(len(valores), dtype=object)
+    arr[:] = valores
+    return arr
+
+
+def _ejecutar_columnar(conn, query: str, params: Optional[tuple]) -> pd.DataFrame:
+    # SSCursor entrega tuplas sin buffer completo: el resultado se consume por lotes
+    with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+        if params:
+            cursor.execute(query, params)
         else:
-            # Si no hay resultados, crear DataFrame vacío con las columnas correctas
-            columns = [desc[0] for desc in cursor.description] if cursor.description else []
-            df = pd.DataFrame(columns=columns)
+            cursor.execute(query)
+        
+        if not cursor.description:
+            return pd.DataFrame()
+        
+        nombres = [desc[0] for desc in cursor.description]
+        dtypes = [_dtype_columna(desc[1]) for desc in cursor.description]
+        lotes = [[] for _ in nombres]
         
-        cursor.close()
-        return df
+        while True:
+            filas = cursor.fetchmany(TAMANO_LOTE)
+            if not filas:
+                break
+            for i, valores in enumerate(zip(*filas)):
+                lotes[i].append(_lote_a_array(valores, dtypes[i]))
     
-    except Exception as e:
-        st.error(f"Error ejecutando query: {str(e)}")
-        raise
+    columnas = {}
+    for nombre, dtype, partes in zip(nombres, dtypes, lotes):
+        if partes:
+            columnas[nombre] = np.concatenate(partes)
+        else:
+            columnas[nombre] = np.empty(0, dtype=dtype or object)
+    return pd.DataFrame(columnas, columns=nombres)
 
 
 def test_connection() -> bool:
@@ -106,11 +380,14 @@ def test_connection() -> bool:
         True si la conexión es exitosa, False en caso contrario
     """
     try:
-        conn = get_database_connection()
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT 1 as test")
-            result = cursor.fetchone()
-            return result['test'] == 1
+        if DatabaseConfig().backend == BACKEND_SEED:
+            return execute_query("SELECT 1 as test")["test"].iloc[0] == 1
+        
+        with get_connection_pool().conexion() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1 as test")
+                result = cursor.fetchone()
+                return result['test'] == 1
     except Exception as e:
         print(f"Error en test de conexión: {str(e)}")
         return False
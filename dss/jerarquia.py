@@ -0,0 +1,103 @@
+"""
+Índice de la jerarquía proyecto -> hitos -> tareas / pruebas del DWH
+
+Se construye una sola vez por snapshot (ver obtener_indice_jerarquia) y permite
+obtener los hitos, tareas y pruebas de un proyecto en O(hijos), sin recorrer
+dim_hitos, dim_tareas ni dim_pruebas en cada consulta.
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .cache import memo_por_frame
+
+VACIO = np.empty(0, dtype=np.int64)
+
+
+def _agrupar(claves: np.ndarray) -> Tuple[pd.Index, np.ndarray, np.ndarray]:
+    """
+    Agrupa posiciones de fila por clave en formato CSR
+
+    Returns:
+        (claves distintas, posiciones ordenadas por clave, offsets): las filas de la
+        clave i son `orden[offsets[i]:offsets[i + 1]]`, en su orden original
+    """
+    codigos, valores = pd.factorize(claves)
+    validos = codigos >= 0
+    orden = np.flatnonzero(validos)[np.argsort(codigos[validos], kind="stable")]
+    offsets = np.zeros(len(valores) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codigos[validos], minlength=len(valores)), out=offsets[1:])
+    return pd.Index(valores), orden, offsets
+
+
+class IndiceJerarquia:
+    """
+    Listas de adyacencia (CSR) proyecto -> filas de dim_hitos, hito -> filas de dim_tareas
+    y hito -> filas de dim_pruebas
+
+    Todas las consultas retornan posiciones de fila (para usar con .iloc/.take) en el
+    orden original de cada tabla.
+    """
+
+    def __init__(self, dim_hitos: pd.DataFrame, dim_tareas: pd.DataFrame, dim_pruebas: pd.DataFrame):
+        self.filas = (len(dim_hitos), len(dim_tareas), len(dim_pruebas))
+        self._hitos = _agrupar(dim_hitos["ID_proyectos"].to_numpy())
+        self._id_hito = dim_hitos["ID_Hito"].to_numpy()
+        self._tareas = _agrupar(dim_tareas["ID_Hito"].to_numpy())
+        self._pruebas = _agrupar(dim_pruebas["ID_Hito"].to_numpy())
+
+    @staticmethod
+    def _rango(grupos, clave) -> np.ndarray:
+        valores, orden, offsets = grupos
+        try:
+            i = valores.get_loc(clave)
+        except (KeyError, TypeError):
+            return VACIO
+        return orden[offsets[i]:offsets[i + 1]]
+
+    def _hijos(self, grupos, ids_hito) -> np.ndarray:
+        valores, orden, offsets = grupos
+        codigos = valores.get_indexer(pd.unique(ids_hito))
+        codigos = codigos[codigos >= 0]
+        if len(codigos) == 0:
+            return VACIO
+        return np.sort(np.concatenate([orden[offsets[c]:offsets[c + 1]] for c in codigos]))
+
+    def hitos(self, id_proyecto) -> np.ndarray:
+        """Filas de dim_hitos del proyecto (incluye hitos repetidos)"""
+        return self._rango(self._hitos, id_proyecto)
+
+    def tareas_de_hito(self, id_hito) -> np.ndarray:
+        """Filas de dim_tareas del hito"""
+        return self._rango(self._tareas, id_hito)
+
+    def pruebas_de_hito(self, id_hito) -> np.ndarray:
+        """Filas de dim_pruebas del hito"""
+        return self._rango(self._pruebas, id_hito)
+
+    def tareas(self, id_proyecto) -> np.ndarray:
+        """Filas de dim_tareas de todos los hitos del proyecto (cada tarea una sola vez)"""
+        return self._hijos(self._tareas, self._id_hito[self.hitos(id_proyecto)])
+
+    def pruebas(self, id_proyecto) -> np.ndarray:
+        """Filas de dim_pruebas de todos los hitos del proyecto (cada prueba una sola vez)"""
+        return self._hijos(self._pruebas, self._id_hito[self.hitos(id_proyecto)])
+
+
+def obtener_indice_jerarquia(tablas: Dict[str, pd.DataFrame]) -> IndiceJerarquia:
+    """
+    Retorna el índice de jerarquía de las tablas dadas, construyéndolo una sola vez por snapshot
+
+    Args:
+        tablas: Tablas del DWH con dim_hitos, dim_tareas y dim_pruebas
+
+    Returns:
+        IndiceJerarquia memorizado junto a dim_hitos
+    """
+    hitos, tareas, pruebas = tablas["dim_hitos"], tablas["dim_tareas"], tablas["dim_pruebas"]
+    # El índice depende de las tres tablas: se memoriza sobre dim_hitos y se invalida si cambian las otras dos
+    indice = memo_por_frame(
+        hitos, "jerarquia", lambda _: IndiceJerarquia(hitos, tareas, pruebas), dependencias=(tareas, pruebas)
+    )
+    return indice
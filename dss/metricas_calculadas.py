@@ -17,34 +17,36 @@ MÉTRICAS IMPLEMENTADAS:
 12. PorcentajeHitosRetrasados: Hitos retrasados / Total hitos
 """
 
+from typing import Optional
+
 import pandas as pd
 import numpy as np
 import streamlit as st
-from .db_config import execute_query
+from .jerarquia import obtener_indice_jerarquia
+from .warehouse import cargar_warehouse
 
 
-@st.cache_data(show_spinner=False)
 def cargar_tablas_completas():
-    """Carga todas las tablas necesarias para cálculos de métricas desde BD"""
+    """
+    Carga todas las tablas necesarias para cálculos de métricas desde BD
+    Son las mismas tablas base del snapshot compartido del DWH (ver dss/warehouse.py)
+    """
     try:
-        return {
-            "hechos_proyectos": execute_query("SELECT * FROM hechos_proyectos"),
-            "hechos_asignaciones": execute_query("SELECT * FROM hechos_asignaciones"),
-            "dim_proyectos": execute_query("SELECT * FROM dim_proyectos"),
-            "dim_clientes": execute_query("SELECT * FROM dim_clientes"),
-            "dim_gastos": execute_query("SELECT * FROM dim_gastos"),
-            "dim_tiempo": execute_query("SELECT * FROM dim_tiempo"),
-            "dim_empleados": execute_query("SELECT * FROM dim_empleados"),
-            "dim_hitos": execute_query("SELECT * FROM dim_hitos"),
-            "dim_tareas": execute_query("SELECT * FROM dim_tareas"),
-            "dim_pruebas": execute_query("SELECT * FROM dim_pruebas"),
-        }
+        return dict(cargar_warehouse().tablas)
     except Exception as e:
         st.error(f"Error cargando tablas desde BD: {str(e)}")
         # Retornar diccionario vacío como fallback
         return {}
 
 
+def obtener_tiempos_carga_tablas() -> pd.DataFrame:
+    """Retorna origen (bd/disco), filas y segundos de carga de cada tabla del snapshot del DWH"""
+    try:
+        return cargar_warehouse().tiempos_carga
+    except Exception:
+        return pd.DataFrame()
+
+
 def calcular_retrasos(id_proyecto: int, tablas: dict) -> dict:
     """
     Métricas: RetrasoInicioDias y RetrasoFinalDias
@@ -160,15 +162,8 @@ def calcular_tasa_errores_encontrados(id_proyecto: int, tablas: dict) -> float:
     Métrica: TasaDeErroresEncontrados
     Fórmula: Cantidad de errores / Cantidad de tareas
     """
-    # Obtener hitos del proyecto
-    hitos_proyecto = tablas["dim_hitos"][
-        tablas["dim_hitos"]["ID_proyectos"] == id_proyecto
-    ]["ID_Hito"].values
-    
-    # Obtener tareas de esos hitos
-    tareas_proyecto = tablas["dim_tareas"][
-        tablas["dim_tareas"]["ID_Hito"].isin(hitos_proyecto)
-    ]
+    # Tareas de los hitos del proyecto
+    tareas_proyecto = tablas["dim_tareas"].iloc[obtener_indice_jerarquia(tablas).tareas(id_proyecto)]
     
     cantidad_tareas = len(tareas_proyecto)
     if cantidad_tareas == 0:
@@ -188,13 +183,7 @@ def calcular_tasa_exito_pruebas(id_proyecto: int, tablas: dict) -> float:
     Métrica: TasaDeExitoEnPruebas
     Fórmula: Pruebas exitosas / Pruebas totales
     """
-    hitos_proyecto = tablas["dim_hitos"][
-        tablas["dim_hitos"]["ID_proyectos"] == id_proyecto
-    ]["ID_Hito"].values
-    
-    pruebas_proyecto = tablas["dim_pruebas"][
-        tablas["dim_pruebas"]["ID_Hito"].isin(hitos_proyecto)
-    ]
+    pruebas_proyecto = tablas["dim_pruebas"].iloc[obtener_indice_jerarquia(tablas).pruebas(id_proyecto)]
     
     if len(pruebas_proyecto) == 0:
         return 0.0
@@ -218,11 +207,7 @@ def calcular_productividad_promedio(id_proyecto: int, tablas: dict) -> float:
     suma_horas_reales = asignaciones_proyecto["HorasReales"].sum()
     
     # Contar hitos del proyecto
-    hitos_proyecto = tablas["dim_hitos"][
-        tablas["dim_hitos"]["ID_proyectos"] == id_proyecto
-    ]
-    
-    cantidad_hitos = len(hitos_proyecto)
+    cantidad_hitos = len(obtener_indice_jerarquia(tablas).hitos(id_proyecto))
     
     if cantidad_hitos == 0:
         return 0.0
@@ -238,13 +223,7 @@ def calcular_porcentaje_tareas_retrasadas(id_proyecto: int, tablas: dict) -> flo
     SeRetraso se marca True si FechaInicioPlanificada != FechaInicioReal
     O si FechaFinPlanificada != FechaFinReal
     """
-    hitos_proyecto = tablas["dim_hitos"][
-        tablas["dim_hitos"]["ID_proyectos"] == id_proyecto
-    ]["ID_Hito"].values
-    
-    tareas_proyecto = tablas["dim_tareas"][
-        tablas["dim_tareas"]["ID_Hito"].isin(hitos_proyecto)
-    ]
+    tareas_proyecto = tablas["dim_tareas"].iloc[obtener_indice_jerarquia(tablas).tareas(id_proyecto)]
     
     if len(tareas_proyecto) == 0:
         return 0.0
@@ -262,9 +241,7 @@ def calcular_porcentaje_hitos_retrasados(id_proyecto: int, tablas: dict) -> floa
     Fórmula: (Hitos retrasados) / Total hitos × 100
     Un hito está retrasado si RetrasoInicioDias > 0 O RetrasoFinDias > 0
     """
-    hitos_proyecto = tablas["dim_hitos"][
-        tablas["dim_hitos"]["ID_proyectos"] == id_proyecto
-    ]
+    hitos_proyecto = tablas["dim_hitos"].iloc[obtener_indice_jerarquia(tablas).hitos(id_proyecto)]
     
     if len(hitos_proyecto) == 0:
         return 0.0
@@ -281,72 +258,181 @@ def calcular_porcentaje_hitos_retrasados(id_proyecto: int, tablas: dict) -> floa
     return float(porcentaje)
 
 
-@st.cache_data(show_spinner=False, ttl=300)  # Cache por 5 minutos
+# Agregados por proyecto a partir de los que se derivan las métricas (ver dss/metricas_incrementales.py)
+COLUMNAS_AGREGADOS = [
+    "ValorHoras", "HorasReales", "Hitos", "HitosRetrasados",
+    "Tareas", "TareasRetrasadas", "Pruebas", "PruebasExitosas",
+]
+
+COLUMNAS_METRICAS_RECALCULADAS = [
+    "RetrasoInicioDias", "RetrasoFinalDias", "Presupuesto", "CosteReal", "DesviacionPresupuestal",
+    "PenalizacionesMonto", "ProporcionCAPEX_OPEX", "TasaDeErroresEncontrados", "TasaDeExitoEnPruebas",
+    "ProductividadPromedio", "PorcentajeTareasRetrasadas", "PorcentajeHitosRetrasados",
+    "CostoHoras", "GastosFinancieros",
+]
+
+
+def conteo_por_hito(df: pd.DataFrame, columna: str, total: str, marcadas: str) -> pd.DataFrame:
+    """Filas de `df` (tareas o pruebas) por hito y cuántas tienen `columna` == 1"""
+    return (
+        pd.DataFrame({"ID_Hito": df["ID_Hito"], "marcada": df[columna] == 1})
+        .groupby("ID_Hito")["marcada"].agg(**{total: "size", marcadas: "sum"})
+        .astype(float)
+    )
+
+
+def agregados_por_hito(tareas: pd.DataFrame, pruebas: pd.DataFrame) -> pd.DataFrame:
+    """Cantidad de tareas (y retrasadas) y de pruebas (y exitosas) de cada hito"""
+    conteo_tareas = conteo_por_hito(tareas, "SeRetraso", "Tareas", "TareasRetrasadas")
+    conteo_pruebas = conteo_por_hito(pruebas, "PruebaExitosa", "Pruebas", "PruebasExitosas")
+    return conteo_tareas.join(conteo_pruebas, how="outer").fillna(0.0)
+
+
+def agregados_por_fila_de_hito(hitos: pd.DataFrame) -> pd.DataFrame:
+    """Hitos y hitos retrasados por proyecto, contados por fila de dim_hitos"""
+    retrasado = hitos["RetrasoFinDias"] > 0
+    if "RetrasoInicioDias" in hitos.columns:
+        retrasado = retrasado | (hitos["RetrasoInicioDias"] > 0)
+    return (
+        pd.DataFrame({"ID_Proyecto": hitos["ID_proyectos"], "retrasado": retrasado})
+        .groupby("ID_Proyecto")["retrasado"].agg(Hitos="size", HitosRetrasados="sum")
+        .astype(float)
+    )
+
+
+def agregados_por_asignacion(asignaciones: pd.DataFrame) -> pd.DataFrame:
+    """Suma de ValorHoras y HorasReales por proyecto"""
+    return asignaciones.groupby("ID_Proyecto")[["ValorHoras", "HorasReales"]].sum().astype(float)
+
+
+def sumar_hitos_a_proyectos(pares: pd.DataFrame, por_hito: pd.DataFrame) -> pd.DataFrame:
+    """
+    Suma los agregados de cada hito a los proyectos a los que pertenece
+
+    Args:
+        pares: Pares (ID_proyectos, ID_Hito) distintos
+        por_hito: Agregados indexados por ID_Hito (ver agregados_por_hito)
+    """
+    unidas = pares.merge(por_hito, left_on="ID_Hito", right_index=True)
+    return unidas.groupby("ID_proyectos")[list(por_hito.columns)].sum().rename_axis("ID_Proyecto")
+
+
+def calcular_agregados_proyectos(tablas: dict) -> pd.DataFrame:
+    """
+    Calcula los agregados de todos los proyectos (horas, hitos, tareas y pruebas)
+
+    Cada tarea/prueba cuenta una vez por proyecto aunque su hito esté repetido en
+    dim_hitos (como el isin de las funciones por proyecto); los hitos se cuentan por fila.
+
+    Returns:
+        DataFrame indexado por ID_Proyecto con las columnas COLUMNAS_AGREGADOS
+    """
+    hitos = tablas["dim_hitos"]
+    pares = hitos[["ID_proyectos", "ID_Hito"]].drop_duplicates()
+    partes = [
+        agregados_por_asignacion(tablas["hechos_asignaciones"]),
+        agregados_por_fila_de_hito(hitos),
+        sumar_hitos_a_proyectos(pares, agregados_por_hito(tablas["dim_tareas"], tablas["dim_pruebas"])),
+    ]
+    return pd.concat(partes, axis=1).reindex(columns=COLUMNAS_AGREGADOS).fillna(0.0)
+
+
+def metricas_desde_agregados(tablas: dict, agregados: pd.DataFrame, ids_proyecto=None) -> pd.DataFrame:
+    """
+    Aplica las fórmulas de las 12 métricas sobre los agregados por proyecto
+
+    Usa además hechos_proyectos (primera fila de cada proyecto, como el .iloc[0] de las
+    funciones por proyecto), dim_proyectos (TotalErrores) y dim_gastos (Monto).
+
+    Args:
+        tablas: Tablas del DWH
+        agregados: Resultado de calcular_agregados_proyectos (o mantenido incrementalmente)
+        ids_proyecto: Proyectos a incluir; por defecto todos los de hechos_proyectos
+
+    Returns:
+        DataFrame con ID_Proyecto y COLUMNAS_METRICAS_RECALCULADAS
+    """
+    hp = tablas["hechos_proyectos"].drop_duplicates("ID_Proyecto").set_index("ID_Proyecto")
+    ids = pd.Index(hp.index if ids_proyecto is None else ids_proyecto, name="ID_Proyecto")
+    proyecto = hp.reindex(ids)
+    agregados = agregados.reindex(ids, fill_value=0.0)
+
+    def columna_hp(nombre):
+        return proyecto[nombre].astype(float) if nombre in proyecto.columns else pd.Series(0.0, index=ids)
+
+    def cociente(numerador, denominador, escala=1.0):
+        # 0 cuando no hay elementos, como las funciones por proyecto
+        return np.where(denominador > 0, numerador / denominador.where(denominador > 0) * escala, 0.0)
+
+    df = pd.DataFrame(index=ids)
+    df["RetrasoInicioDias"] = np.trunc(columna_hp("RetrasoInicioDias")).astype("Int64")
+    df["RetrasoFinalDias"] = np.trunc(columna_hp("RetrasoFinalDias")).astype("Int64")
+    df["Presupuesto"] = columna_hp("Presupuesto")
+
+    # Coste real: horas de asignaciones + gastos financieros del ID_Gasto del proyecto
+    df["CostoHoras"] = agregados["ValorHoras"]
+    if "ID_Gasto" in proyecto.columns:
+        montos = tablas["dim_gastos"].groupby("ID_Finanza")["Monto"].sum()
+        df["GastosFinancieros"] = proyecto["ID_Gasto"].map(montos).fillna(0).astype(float)
+    else:
+        df["GastosFinancieros"] = 0.0
+    df["CosteReal"] = df["CostoHoras"] + df["GastosFinancieros"]
+    df["DesviacionPresupuestal"] = df["Presupuesto"] - df["CosteReal"]
+
+    df["PenalizacionesMonto"] = columna_hp("PenalizacionesMonto")
+    df["ProporcionCAPEX_OPEX"] = columna_hp("ProporcionCAPEX_OPEX")
+
+    total_errores = tablas["dim_proyectos"].drop_duplicates("ID_Proyecto").set_index("ID_Proyecto")["TotalErrores"]
+    df["TasaDeErroresEncontrados"] = cociente(ids.map(total_errores).astype(float), agregados["Tareas"])
+    df["TasaDeExitoEnPruebas"] = cociente(agregados["PruebasExitosas"], agregados["Pruebas"])
+    df["ProductividadPromedio"] = cociente(agregados["HorasReales"], agregados["Hitos"])
+    df["PorcentajeTareasRetrasadas"] = cociente(agregados["TareasRetrasadas"], agregados["Tareas"], 100)
+    df["PorcentajeHitosRetrasados"] = cociente(agregados["HitosRetrasados"], agregados["Hitos"], 100)
+
+    return df[COLUMNAS_METRICAS_RECALCULADAS].reset_index()
+
+
+def calcular_metricas_proyectos(tablas: dict, ids_proyecto=None) -> pd.DataFrame:
+    """
+    Calcula las 12 métricas de todos los proyectos en una sola pasada (groupby/merge)
+
+    Equivale a llamar a cada función calcular_* por proyecto, pero recorre cada tabla una
+    sola vez en lugar de una vez por proyecto. Igual que esas funciones, los porcentajes de
+    tareas e hitos retrasados quedan en escala 0-100 y las tasas en escala 0-1.
+
+    Args:
+        tablas: Tablas del DWH (ver cargar_tablas_completas)
+        ids_proyecto: Proyectos a calcular; por defecto todos los de hechos_proyectos
+
+    Returns:
+        DataFrame con ID_Proyecto, las 12 métricas y el desglose CostoHoras / GastosFinancieros
+    """
+    return metricas_desde_agregados(tablas, calcular_agregados_proyectos(tablas), ids_proyecto)
+
+
 def generar_dataframe_metricas_calculadas() -> pd.DataFrame:
     """
     Genera un DataFrame con todas las métricas calculadas.
-    Las métricas ya están precalculadas en hechos_proyectos
+    Las métricas ya están precalculadas en hechos_proyectos (snapshot compartido del DWH)
     """
-    # Cargar SOLO la tabla de hechos_proyectos, no todas las tablas
     try:
-        df_hechos = execute_query("SELECT * FROM hechos_proyectos")
+        df_metricas = cargar_warehouse().metricas
     except Exception as e:
         st.error(f"Error cargando hechos_proyectos: {str(e)}")
         return pd.DataFrame()
     
-    # Verificar que tenemos columnas (debug)
-    if len(df_hechos.columns) == 0 or not isinstance(df_hechos.columns[0], str):
-        st.error(f"⚠️ DataFrame sin columnas nombradas. Tipo: {type(df_hechos.columns[0]) if len(df_hechos.columns) > 0 else 'N/A'}")
-        return pd.DataFrame()
-    
-    # Seleccionar solo las columnas de métricas que necesitamos
-    columnas_metricas = [
-        "ID_Proyecto",
-        "RetrasoInicioDias",
-        "RetrasoFinalDias",
-        "Presupuesto",
-        "CosteReal",
-        "DesviacionPresupuestal",
-        "PenalizacionesMonto",
-        "ProporcionCAPEX_OPEX",
-        "TasaDeErroresEncontrados",
-        "TasaDeExitoEnPruebas",
-        "ProductividadPromedio",
-        "PorcentajeTareasRetrasadas",
-        "PorcentajeHitosRetrasados",
-    ]
-    
-    # Filtrar solo las columnas que existen
-    columnas_existentes = [col for col in columnas_metricas if col in df_hechos.columns]
-    
-    if len(columnas_existentes) == 0:
-        st.error(f"⚠️ No se encontraron columnas de métricas. Columnas disponibles: {list(df_hechos.columns)[:5]}")
-        return pd.DataFrame()
-    
-    df_metricas = df_hechos[columnas_existentes].copy()
-    
-    # Convertir todas las columnas numéricas primero
-    for col in df_metricas.columns:
-        if col != "ID_Proyecto":  # No convertir ID
-            df_metricas[col] = pd.to_numeric(df_metricas[col], errors='coerce')
-    
-    # Convertir porcentajes a decimal (0-1) si están en formato 0-100
-    for col in ["TasaDeErroresEncontrados", "TasaDeExitoEnPruebas", "PorcentajeTareasRetrasadas", "PorcentajeHitosRetrasados"]:
-        if col in df_metricas.columns:
-            # Si los valores son > 1, están en formato 0-100, convertir a 0-1
-            max_val = df_metricas[col].max()
-            if not pd.isna(max_val) and max_val > 1:
-                df_metricas[col] = df_metricas[col] / 100
-    
-    print(f"✅ Métricas cargadas para {len(df_metricas)} proyectos")
+    if df_metricas.empty:
+        st.error("⚠️ No se encontraron columnas de métricas en hechos_proyectos")
     return df_metricas
 
 
-def obtener_estadisticas_metricas_calculadas() -> dict:
+def obtener_estadisticas_metricas_calculadas(df_metricas: Optional[pd.DataFrame] = None) -> dict:
     """
     Retorna estadísticas agregadas de las métricas calculadas
+    (por defecto las precalculadas de generar_dataframe_metricas_calculadas)
     """
-    df_metricas = generar_dataframe_metricas_calculadas()
+    if df_metricas is None:
+        df_metricas = generar_dataframe_metricas_calculadas()
     
     # Función auxiliar para obtener valor de columna de forma segura
     def get_value(col_name, operation='mean', default=0):
@@ -0,0 +1,220 @@
+"""
+Mantenimiento incremental de las métricas recalculadas por proyecto
+
+Parte de los agregados por proyecto del snapshot del DWH (horas reales, hitos,
+tareas, pruebas y sus conteos de retraso/éxito) y los actualiza con las filas
+nuevas de cada tabla (ID mayor que el último visto), recalculando sólo los
+proyectos afectados. Un hilo en segundo plano consulta las filas nuevas cada
+DSS_METRICAS_INTERVALO segundos, así las métricas se refrescan en segundos sin
+recargar tablas completas ni consultar la BD al renderizar. Se asume que las
+tablas de hechos y dimensiones sólo reciben inserciones; las modificaciones se
+recogen al recargar el snapshot (WAREHOUSE_TTL).
+"""
+import threading
+import time
+import weakref
+from collections import defaultdict
+from typing import Dict, Optional
+
+import pandas as pd
+import streamlit as st
+
+from .cache import memo_por_frame
+from .config import METRICAS_INTERVALO
+from .db_config import execute_query
+from .metricas_calculadas import (
+    COLUMNAS_AGREGADOS,
+    agregados_por_asignacion,
+    agregados_por_fila_de_hito,
+    agregados_por_hito,
+    calcular_agregados_proyectos,
+    conteo_por_hito,
+    metricas_desde_agregados,
+    sumar_hitos_a_proyectos,
+)
+from .snapshots import TABLAS_DWH
+from .warehouse import cargar_warehouse, porcentajes_a_decimal, solo_lectura
+
+# Tablas que alimentan las métricas, en el orden en que se aplican sus deltas
+TABLAS_INCREMENTALES = [
+    "hechos_proyectos", "dim_proyectos", "dim_gastos",
+    "dim_hitos", "dim_tareas", "dim_pruebas", "hechos_asignaciones",
+]
+
+# Columna marcada y nombres de los conteos por hito de tareas y pruebas
+CONTEOS_POR_HITO = {
+    "dim_tareas": ("SeRetraso", "Tareas", "TareasRetrasadas"),
+    "dim_pruebas": ("PruebaExitosa", "Pruebas", "PruebasExitosas"),
+}
+
+# Tablas pequeñas de las que sólo se toman columnas por proyecto: se conservan completas
+TABLAS_ACUMULADAS = ["hechos_proyectos", "dim_proyectos", "dim_gastos"]
+
+
+class MetricasIncrementales:
+    """Agregados por proyecto mantenidos a partir de un feed de filas nuevas por tabla"""
+
+    def __init__(self, tablas: Dict[str, pd.DataFrame], version: str):
+        self.version = version
+        self._lock = threading.Lock()
+        self._lock_sincronizacion = threading.Lock()
+        self._tablas = {tabla: tablas[tabla] for tabla in TABLAS_ACUMULADAS}
+        self._agregados = calcular_agregados_proyectos(tablas)
+        self._por_hito = agregados_por_hito(tablas["dim_tareas"], tablas["dim_pruebas"])
+        self._proyectos_de_hito = defaultdict(set)
+        for id_proyecto, id_hito in tablas["dim_hitos"][["ID_proyectos", "ID_Hito"]].drop_duplicates().itertuples(index=False):
+            self._proyectos_de_hito[id_hito].add(id_proyecto)
+        self._marcas = {tabla: self._max_id(tablas[tabla], tabla) for tabla in TABLAS_INCREMENTALES}
+        self._metricas: Optional[pd.DataFrame] = None
+        self._hilo: Optional[threading.Thread] = None
+        self.ultima_sincronizacion = time.monotonic()
+
+    @staticmethod
+    def _max_id(df: pd.DataFrame, tabla: str):
+        ids = pd.to_numeric(df[TABLAS_DWH[tabla]], errors="coerce") if len(df) else pd.Series(dtype=float)
+        return None if ids.isna().all() else ids.max().item()
+
+    def _sumar(self, delta: pd.DataFrame):
+        """Suma un delta (indexado por ID_Proyecto) a los agregados de los proyectos afectados"""
+        if delta.empty:
+            return
+        nuevos = delta.index.difference(self._agregados.index)
+        if len(nuevos):
+            vacios = pd.DataFrame(0.0, index=nuevos, columns=COLUMNAS_AGREGADOS)
+            self._agregados = pd.concat([self._agregados, vacios])
+        self._agregados.loc[delta.index, delta.columns] += delta
+
+    def aplicar_delta(self, tabla: str, nuevas: pd.DataFrame):
+        """
+        Incorpora filas nuevas de una tabla a los agregados
+
+        Args:
+            tabla: Tabla de TABLAS_INCREMENTALES
+            nuevas: Filas insertadas desde la última sincronización
+        """
+        if nuevas.empty:
+            return
+        if tabla in TABLAS_ACUMULADAS:
+            self._tablas[tabla] = pd.concat([self._tablas[tabla], nuevas], ignore_index=True)
+        elif tabla == "hechos_asignaciones":
+            self._sumar(agregados_por_asignacion(nuevas))
+        elif tabla == "dim_hitos":
+            self._sumar(agregados_por_fila_de_hito(nuevas))
+            # Pares proyecto-hito nuevos: el proyecto hereda las tareas/pruebas ya cargadas del hito
+            pares = [
+                (id_proyecto, id_hito)
+                for id_proyecto, id_hito in nuevas[["ID_proyectos", "ID_Hito"]].drop_duplicates().itertuples(index=False)
+                if id_proyecto not in self._proyectos_de_hito[id_hito]
+            ]
+            for id_proyecto, id_hito in pares:
+                self._proyectos_de_hito[id_hito].add(id_proyecto)
+            if pares:
+                self._sumar(sumar_hitos_a_proyectos(pd.DataFrame(pares, columns=["ID_proyectos", "ID_Hito"]), self._por_hito))
+        else:
+            delta = conteo_por_hito(nuevas, *CONTEOS_POR_HITO[tabla])
+            self._por_hito = self._por_hito.add(delta, fill_value=0.0).fillna(0.0)
+            pares = [
+                (id_proyecto, id_hito) for id_hito in delta.index for id_proyecto in self._proyectos_de_hito.get(id_hito, ())
+            ]
+            if pares:
+                self._sumar(sumar_hitos_a_proyectos(pd.DataFrame(pares, columns=["ID_proyectos", "ID_Hito"]), delta))
+        self._metricas = None
+
+    def sincronizar(self) -> Dict[str, int]:
+        """
+        Consulta las filas con ID mayor a la última marca de cada tabla y las incorpora
+
+        Returns:
+            Diccionario {tabla: filas nuevas}
+        """
+        # Una sincronización a la vez; las marcas sólo cambian aquí, así que se leen sin self._lock
+        with self._lock_sincronizacion:
+            # Las consultas se hacen sin bloquear metricas(): los renders no esperan a la BD
+            nuevas_por_tabla = {}
+            for tabla in TABLAS_INCREMENTALES:
+                pk = TABLAS_DWH[tabla]
+                marca = self._marcas[tabla]
+                if marca is None:
+                    nuevas_por_tabla[tabla] = execute_query(f"SELECT * FROM {tabla}", columnar=True)
+                else:
+                    nuevas_por_tabla[tabla] = execute_query(
+                        f"SELECT * FROM {tabla} WHERE {pk} > %s ORDER BY {pk}", (marca,), columnar=True
+                    )
+
+            with self._lock:
+                for tabla, nuevas in nuevas_por_tabla.items():
+                    self.aplicar_delta(tabla, nuevas)
+                    if not nuevas.empty:
+                        self._marcas[tabla] = self._max_id(nuevas, tabla)
+                self.ultima_sincronizacion = time.monotonic()
+        return {tabla: len(nuevas) for tabla, nuevas in nuevas_por_tabla.items()}
+
+    def metricas(self) -> pd.DataFrame:
+        """
+        Retorna las métricas de todos los proyectos con los agregados vigentes (sin consultar la BD)
+
+        Returns:
+            DataFrame de métricas (ver metricas_desde_agregados); no debe modificarse
+        """
+        with self._lock:
+            if self._metricas is None:
+                self._metricas = solo_lectura(metricas_desde_agregados(self._tablas, self._agregados))
+            return self._metricas
+
+    def iniciar_sincronizacion(self, intervalo: float = METRICAS_INTERVALO):
+        """Sincroniza cada `intervalo` segundos en un hilo aparte mientras el mantenedor siga en uso"""
+        if self._hilo is not None:
+            return
+        detener = threading.Event()
+        # El hilo sólo guarda una referencia débil: al descartarse el mantenedor (nuevo snapshot) termina
+        weakref.finalize(self, detener.set)
+        self._hilo = threading.Thread(
+            target=_sincronizar_periodicamente,
+            args=(weakref.ref(self), detener, intervalo),
+            name="metricas-incrementales",
+            daemon=True,
+        )
+        self._hilo.start()
+
+
+def _sincronizar_periodicamente(referencia, detener: threading.Event, intervalo: float):
+    while not detener.wait(intervalo):
+        mantenedor = referencia()
+        if mantenedor is None:
+            return
+        try:
+            mantenedor.sincronizar()
+        except Exception as e:
+            # Sin acceso a la BD se siguen sirviendo los agregados vigentes
+            print(f"⚠️ No se pudieron sincronizar las métricas incrementales: {e}")
+        del mantenedor
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_metricas_incrementales(version: str) -> MetricasIncrementales:
+    """Retorna el mantenedor de métricas del snapshot `version`, compartido por todas las sesiones"""
+    mantenedor = MetricasIncrementales(cargar_warehouse().tablas, version)
+    mantenedor.iniciar_sincronizacion()
+    return mantenedor
+
+
+def generar_dataframe_metricas_recalculadas() -> pd.DataFrame:
+    """
+    Recalcula las 12 métricas de todos los proyectos desde las tablas base del DWH
+    (en lugar de tomar las columnas precalculadas de hechos_proyectos), al día con
+    las filas insertadas desde la carga del snapshot
+
+    Las tasas y porcentajes se llevan a escala 0-1 con la misma regla que las columnas
+    del snapshot (ver porcentajes_a_decimal), para mostrarse igual en el dashboard. El
+    costo real (y con él la desviación presupuestal) y la productividad siguen las
+    fórmulas de metricas_calculadas, no las del ETL, así que no coinciden con las
+    columnas precalculadas de hechos_proyectos.
+    """
+    try:
+        metricas = get_metricas_incrementales(cargar_warehouse().version).metricas()
+        return memo_por_frame(
+            metricas, "escala_decimal", lambda df: solo_lectura(porcentajes_a_decimal(df.copy()))
+        )
+    except Exception as e:
+        st.error(f"Error recalculando métricas: {str(e)}")
+        return pd.DataFrame()
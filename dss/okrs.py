@@ -1,6 +1,10 @@
 """
 Definición de OKRs (Objectives and Key Results) del sistema
 """
+from typing import Dict
+
+import numpy as np
+import pandas as pd
 
 OKRS = {
     "O1_Excelencia_Financiera": {
@@ -129,76 +133,124 @@ OKRS = {
 }
 
 
+# Métricas donde menor es mejor
+METRICAS_MENOR_ES_MEJOR = frozenset([
+    "proyectos_cancelados", "desviacion_presupuestal", "penalizaciones_sobre_presupuesto",
+    "porcentaje_tareas_retrasadas", "porcentaje_hitos_retrasados", "tasa_errores", "retraso_final_dias",
+])
+
+# Menor es mejor con target 0: progreso según el primer límite que no supera el valor (escala logarítmica)
+ESCALA_TARGET_CERO = ((0.01, 90), (0.05, 70), (0.10, 50), (0.20, 30), (0.50, 10))
+
+# Menor es mejor con target > 0: 100% en el target y PROGRESO_MINIMO a partir de RATIO_PROGRESO_MINIMO veces el target
+RATIO_PROGRESO_MINIMO = 5.0
+PROGRESO_MINIMO = 5
+
+# Una fila por key result, en el orden de OKRS
+KEY_RESULTS = pd.DataFrame([
+    {
+        "okr": okr_key,
+        "kr": kr["kr"],
+        "metrica": kr["metrica"],
+        "target": float(kr["target"]),
+        "peso": kr["peso"],
+        "menor_es_mejor": kr["metrica"] in METRICAS_MENOR_ES_MEJOR,
+    }
+    for okr_key, okr in OKRS.items()
+    for kr in okr["key_results"]
+])
+
+
+def _progreso_key_results(valores: np.ndarray) -> np.ndarray:
+    """
+    Progreso (0-100%) de cada key result sin recortar
+
+    Args:
+        valores: (cortes, key results) valor de la métrica de cada KR de KEY_RESULTS
+
+    Returns:
+        Array del mismo tamaño; NaN sólo en métricas donde mayor es mejor con valor NaN
+    """
+    target = KEY_RESULTS["target"].to_numpy()
+    menor_es_mejor = KEY_RESULTS["menor_es_mejor"].to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Menor es mejor con target 0: escalones; un valor NaN no cumple ningún límite
+        escalones = np.select(
+            [valores <= limite for limite, _ in ESCALA_TARGET_CERO],
+            [progreso for _, progreso in ESCALA_TARGET_CERO],
+            default=PROGRESO_MINIMO,
+        )
+        # Menor es mejor con target > 0: lineal entre 1x (100%) y RATIO_PROGRESO_MINIMO x (PROGRESO_MINIMO)
+        ratio = valores / target
+        lineal = np.where(
+            ratio >= RATIO_PROGRESO_MINIMO,
+            PROGRESO_MINIMO,
+            np.fmax(PROGRESO_MINIMO, 100 * (RATIO_PROGRESO_MINIMO - ratio) / (RATIO_PROGRESO_MINIMO - 1)),
+        )
+        menor = np.where(valores <= target, 100, np.where(target == 0, escalones, lineal))
+        mayor = np.where(valores >= target, 100, np.where(target > 0, (valores / target) * 100, 0))
+
+    return np.where(menor_es_mejor, menor, mayor).astype(float)
+
+
+def evaluar_okrs(kpis: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Calcula el progreso de todos los OKRs para muchos cortes a la vez
+
+    Args:
+        kpis: Una fila por corte (cliente, año, proyecto...) y una columna por métrica
+            (los mismos nombres que get_kpis); las métricas ausentes valen 0
+
+    Returns:
+        Diccionario con (mismo índice que `kpis`):
+        - key_results: progreso (0-100) de cada KR, columnas KR1.1, KR1.2...
+        - objetivos: progreso ponderado de cada OKR, columnas O1_..., O4_...
+    """
+    metricas = KEY_RESULTS["metrica"]
+    valores = kpis.reindex(columns=metricas.unique(), fill_value=0.0).astype("float64")[metricas].to_numpy()
+    progreso = _progreso_key_results(valores)
+
+    objetivos = {}
+    for okr_key, filas in KEY_RESULTS.groupby("okr", sort=False).indices.items():
+        pesos = KEY_RESULTS["peso"].to_numpy()[filas]
+        # Se acumula KR por KR, igual que calcular_progreso_okr; un NaN deja el objetivo en NaN
+        ponderado = np.zeros(len(kpis))
+        for fila, peso in zip(filas, pesos):
+            ponderado = ponderado + progreso[:, fila] * peso
+        objetivos[okr_key] = ponderado / pesos.sum() if pesos.sum() > 0 else np.zeros(len(kpis))
+
+    return {
+        # Como min(100, progreso) en Python, un progreso NaN se muestra como 100
+        "key_results": pd.DataFrame(np.fmin(100, progreso), index=kpis.index, columns=KEY_RESULTS["kr"].tolist()),
+        "objetivos": pd.DataFrame(objetivos, index=kpis.index),
+    }
+
+
 def calcular_progreso_okr(okr_key: str, kpis: dict) -> dict:
     """
     Calcula el progreso de un OKR basado en sus Key Results
     """
     okr = OKRS[okr_key]
-    key_results_progreso = []
-    peso_total = 0
-    progreso_ponderado = 0
-    
-    for kr in okr["key_results"]:
-        metrica_valor = kpis.get(kr["metrica"], 0)
-        target = kr["target"]
-        peso = kr["peso"]
-        
-        # Calcular progreso (0-100%)
-        if kr["metrica"] in ["proyectos_cancelados", "desviacion_presupuestal", 
-                             "penalizaciones_sobre_presupuesto", "porcentaje_tareas_retrasadas",
-                             "porcentaje_hitos_retrasados", "tasa_errores", "retraso_final_dias"]:
-            # Métricas donde menor es mejor
-            if metrica_valor <= target:
-                # Si cumple o supera el objetivo (valor menor o igual al target)
-                progreso = 100
-            elif target == 0:
-                # Si el target es 0 y el valor es mayor, usar escala logarítmica
-                if metrica_valor <= 0.01:
-                    progreso = 90
-                elif metrica_valor <= 0.05:
-                    progreso = 70
-                elif metrica_valor <= 0.10:
-                    progreso = 50
-                elif metrica_valor <= 0.20:
-                    progreso = 30
-                elif metrica_valor <= 0.50:
-                    progreso = 10
-                else:
-                    progreso = 5
-            else:
-                # Calcular progreso inversamente proporcional
-                # Usar escala más amplia: target = 100%, 5*target = 0%
-                ratio = metrica_valor / target
-                if ratio >= 5.0:
-                    progreso = 5  # Mínimo 5% para mostrar que hay datos
-                else:
-                    # Progreso lineal: entre 1x (100%) y 5x (5%) del target
-                    progreso = max(5, 100 * (5.0 - ratio) / 4.0)
-        else:
-            # Métricas donde mayor es mejor
-            if metrica_valor >= target:
-                progreso = 100
-            else:
-                progreso = (metrica_valor / target) * 100 if target > 0 else 0
-        
-        key_results_progreso.append({
+    resultado = evaluar_okrs(pd.DataFrame([kpis]))
+    progreso_kr = resultado["key_results"].iloc[0]
+
+    key_results_progreso = [
+        {
             "kr": kr["kr"],
             "descripcion": kr["descripcion"],
-            "metrica_valor": metrica_valor,
-            "target": target,
-            "progreso": min(100, progreso),
-            "peso": peso
-        })
-        
-        peso_total += peso
-        progreso_ponderado += progreso * peso
-    
-    progreso_general = progreso_ponderado / peso_total if peso_total > 0 else 0
-    
+            "metrica_valor": kpis.get(kr["metrica"], 0),
+            "target": kr["target"],
+            "progreso": progreso_kr[kr["kr"]],
+            "peso": kr["peso"]
+        }
+        for kr in okr["key_results"]
+    ]
+
     return {
         "objetivo": okr["objetivo"],
         "descripcion": okr["descripcion"],
-        "progreso_general": progreso_general,
+        "progreso_general": resultado["objetivos"][okr_key].iloc[0],
         "key_results": key_results_progreso
     }
 
@@ -1,34 +1,109 @@
+from typing import Optional
+
 import numpy as np
 import pandas as pd
-from scipy.stats import rayleigh
+from sklearn.base import BaseEstimator
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import r2_score, mean_squared_error
 import streamlit as st
 
+from .registro_modelos import get_registro_modelos, huella_datos
+from .similitud import COLUMNAS_RESULTADO, obtener_indice_similitud
+
+
+COLUMNAS_FEATURES = [
+    "Presupuesto",
+    "NumTrabajadores",
+    "RetrasoInicioDias",
+    "RetrasoFinalDias",
+    "ProductividadPromedio",
+]
+
+# Ubicación del pico de defectos (fracción de la duración) según complejidad
+FACTORES_COMPLEJIDAD = {
+    "baja": 0.25,    # Pico temprano (25% del proyecto)
+    "media": 0.33,   # Pico en 1/3 del proyecto
+    "alta": 0.40     # Pico más tardío (40% del proyecto)
+}
+
+# Límites de tasa de defectos por persona por semana entre riesgo Bajo/Medio y Medio/Alto
+UMBRALES_RIESGO = (0.5, 1.5)
+NIVELES_RIESGO = np.array(["Bajo", "Medio", "Alto"])
+
+# Semanas que agrupa cada periodo del plan de testing
+PERIODOS_PLAN = {"semana": 1, "sprint": 2, "mes": 4}
+
+# Fracción de los defectos totales por semana a partir de la cual el esfuerzo de QA es Alto / Medio
+UMBRALES_ESFUERZO_QA = (0.15, 0.08)
+ESFUERZOS_QA = pd.CategoricalDtype(["Alto", "Medio", "Bajo"], ordered=True)
+RECURSOS_QA = pd.CategoricalDtype(["2-3 QA", "1-2 QA", "1 QA"], ordered=True)
+
 
 def preparar_features_target(df: pd.DataFrame):
-    features = df[
-        [
-            "Presupuesto",
-            "NumTrabajadores",
-            "RetrasoInicioDias",
-            "RetrasoFinalDias",
-            "ProductividadPromedio",
-        ]
-    ]
+    features = df[COLUMNAS_FEATURES]
     target = df["TotalErrores"]
     return features, target
 
 
-@st.cache_data(show_spinner=False)
-def entrenar_modelo(df_proyectos: pd.DataFrame) -> LinearRegression:
+NOMBRE_MODELO = "defectos"
+
+
+def entrenar_modelo(df_proyectos: pd.DataFrame) -> BaseEstimator:
+    """
+    Retorna el modelo de defectos para los datos dados, reutilizando el registrado si existe
+
+    Sólo se entrena (y se registra una nueva versión) cuando la huella de los datos de
+    entrenamiento no tiene un modelo en el registro (ver dss/registro_modelos.py). El
+    registrado puede ser cualquier regresor de scikit-learn elegido por
+    dss/seleccion_modelos.py; el entrenado aquí es una regresión lineal.
+    """
+    return _modelo_para_huella(huella_datos(df_proyectos, COLUMNAS_FEATURES + ["TotalErrores"]), df_proyectos)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _modelo_para_huella(huella: str, _df_proyectos: pd.DataFrame):
+    registro = get_registro_modelos()
+    try:
+        registrado = registro.cargar(NOMBRE_MODELO, huella)
+    except Exception as e:
+        print(f"⚠️ No se pudo leer el registro de modelos: {e}")
+        registrado = None
+    if registrado is not None:
+        return registrado[0]
+    return _entrenar_y_registrar(huella, _df_proyectos)
+
+
+def _entrenar_y_registrar(huella: str, df_proyectos: pd.DataFrame) -> BaseEstimator:
     features, target = preparar_features_target(df_proyectos)
     modelo = LinearRegression()
     modelo.fit(features, target)
+    try:
+        get_registro_modelos().registrar(
+            NOMBRE_MODELO, modelo, huella, COLUMNAS_FEATURES,
+            obtener_metricas_modelo(df_proyectos, modelo), len(df_proyectos),
+        )
+    except Exception as e:
+        # El registro es una optimización: sin disco se sigue con el modelo en memoria
+        print(f"⚠️ No se pudo registrar el modelo: {e}")
     return modelo
 
 
-def obtener_metricas_modelo(df_proyectos: pd.DataFrame, modelo: LinearRegression) -> dict:
+def limpiar_modelos_en_memoria():
+    """Descarta los modelos en memoria para que la próxima ejecución lea el registro"""
+    _modelo_para_huella.clear()
+
+
+def metadatos_modelo(df_proyectos: pd.DataFrame) -> Optional[dict]:
+    """Metadatos de la última versión registrada para los datos dados (None si no hay)"""
+    huella = huella_datos(df_proyectos, COLUMNAS_FEATURES + ["TotalErrores"])
+    try:
+        versiones = get_registro_modelos().versiones(NOMBRE_MODELO)
+    except Exception:
+        return None
+    return next((entrada for entrada in reversed(versiones) if entrada["huella"] == huella), None)
+
+
+def obtener_metricas_modelo(df_proyectos: pd.DataFrame, modelo: BaseEstimator) -> dict:
     """Calcula métricas de desempeño del modelo"""
     features, target = preparar_features_target(df_proyectos)
     predicciones = modelo.predict(features)
@@ -45,6 +120,53 @@ def obtener_metricas_modelo(df_proyectos: pd.DataFrame, modelo: LinearRegression
     }
 
 
+def rayleigh_cdf(tiempo, sigma) -> np.ndarray:
+    """
+    CDF de Rayleigh en forma cerrada: F(t) = 1 - exp(-t² / (2·sigma²)) para t >= 0
+
+    `tiempo` y `sigma` se combinan con broadcasting (p. ej. tiempo (T,) y sigma (n, 1)
+    dan (n, T)). Con sigma <= 0 el resultado es NaN, igual que scipy.stats.rayleigh.
+    """
+    tiempo = np.asarray(tiempo, dtype=float)
+    sigma = np.asarray(sigma, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cdf = -np.expm1(-0.5 * (np.maximum(tiempo, 0.0) / sigma) ** 2)
+    return np.where(sigma > 0, cdf, np.nan)
+
+
+def rayleigh_pdf(tiempo, sigma) -> np.ndarray:
+    """
+    Densidad de Rayleigh en forma cerrada: f(t) = t / sigma² · exp(-t² / (2·sigma²)) para t >= 0
+
+    Mismo broadcasting y tratamiento de sigma <= 0 que rayleigh_cdf.
+    """
+    tiempo = np.maximum(np.asarray(tiempo, dtype=float), 0.0)
+    sigma = np.asarray(sigma, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = tiempo / sigma
+        pdf = z / sigma * np.exp(-0.5 * z ** 2)
+    return np.where(sigma > 0, pdf, np.nan)
+
+
+def incrementos_rayleigh(total_defectos, duracion: int, sigma) -> np.ndarray:
+    """
+    Defectos nuevos en cada semana 1..duracion según la curva de Rayleigh
+
+    Args:
+        total_defectos: Defectos totales esperados (escalar o array (n,))
+        duracion: Duración del proyecto en SEMANAS
+        sigma: Parámetro de escala (escalar o array (n,))
+
+    Returns:
+        Array (duracion,) o (n, duracion): incremento de defectos acumulados de la semana
+        k-1 a la k
+    """
+    tiempo = np.arange(int(duracion) + 1, dtype=float)
+    total_defectos = np.asarray(total_defectos, dtype=float)[..., None]
+    acumulados = total_defectos * rayleigh_cdf(tiempo, np.asarray(sigma, dtype=float)[..., None])
+    return np.diff(acumulados, axis=-1)
+
+
 def rayleigh_curve(total_defectos: float, duracion: int, sigma: float) -> pd.DataFrame:
     """
     Genera la curva de Rayleigh para acumulación de defectos.
@@ -59,8 +181,7 @@ def rayleigh_curve(total_defectos: float, duracion: int, sigma: float) -> pd.Dat
     """
     # Generar puntos de tiempo desde 0 hasta duracion (en semanas)
     tiempo = np.linspace(0, duracion, num=duracion + 1)
-    cdf = rayleigh.cdf(tiempo, scale=sigma)
-    defectos_acumulados = total_defectos * cdf
+    defectos_acumulados = total_defectos * rayleigh_cdf(tiempo, sigma)
     return pd.DataFrame({"Tiempo": tiempo, "DefectosAcumulados": defectos_acumulados})
 
 
@@ -71,11 +192,7 @@ def calcular_sigma(duracion: int, complejidad: str) -> float:
     Para proyectos de software, típicamente el pico está entre 25-40% de la duración.
     """
     # Posicionar el pico entre 25-40% de la duración según complejidad
-    base_factor = {
-        "baja": 0.25,    # Pico temprano (25% del proyecto)
-        "media": 0.33,   # Pico en 1/3 del proyecto
-        "alta": 0.40     # Pico más tardío (40% del proyecto)
-    }.get(complejidad, 0.33)
+    base_factor = FACTORES_COMPLEJIDAD.get(complejidad, 0.33)
     
     return duracion * base_factor
 
@@ -87,11 +204,11 @@ def clasificar_nivel_riesgo(defectos: float, trabajadores: int, duracion: int) -
     # Calcular tasa de defectos por persona por semana
     tasa_defectos = defectos / (trabajadores * (duracion / 7))
     
-    if tasa_defectos < 0.5:
+    if tasa_defectos < UMBRALES_RIESGO[0]:
         nivel = "Bajo"
         color = "#2e7d32"  # Verde
         icono = "[BAJO]"
-    elif tasa_defectos < 1.5:
+    elif tasa_defectos < UMBRALES_RIESGO[1]:
         nivel = "Medio"
         color = "#f9a825"  # Amarillo
         icono = "[MEDIO]"
@@ -108,6 +225,132 @@ def clasificar_nivel_riesgo(defectos: float, trabajadores: int, duracion: int) -
     }
 
 
+def predecir_escenarios(
+    modelo,
+    presupuesto,
+    trabajadores,
+    duracion,
+    retraso_inicio=0,
+    retraso_final=0,
+    complejidad="media",
+    productividad=0.75,
+) -> dict:
+    """
+    Evalúa muchos escenarios what-if en una sola llamada vectorizada
+
+    Cada argumento puede ser un escalar o un array; se combinan con broadcasting de
+    NumPy. Equivale a llamar por escenario a modelo.predict, calcular_sigma,
+    rayleigh_curve y clasificar_nivel_riesgo.
+
+    Args:
+        modelo: Modelo entrenado (ver entrenar_modelo)
+        presupuesto: Presupuesto estimado ($)
+        trabajadores: Tamaño de equipo
+        duracion: Duración en SEMANAS (entera)
+        retraso_inicio: Retraso inicial esperado (días)
+        retraso_final: Retraso final esperado (días)
+        complejidad: "baja", "media" o "alta"
+        productividad: ProductividadPromedio usada como feature
+
+    Returns:
+        Diccionario de arrays con una fila por escenario:
+        - defectos, duracion, sigma, tasa: (n,)
+        - nivel: (n,) con "Bajo"/"Medio"/"Alto"; codigo_riesgo: (n,) con 0/1/2
+        - tiempo: (T,) semanas 0..max(duracion)
+        - curvas: (n, T) defectos acumulados; NaN después de la duración de cada escenario
+    """
+    presupuesto, trabajadores, duracion, retraso_inicio, retraso_final, complejidad, productividad = np.broadcast_arrays(
+        *(np.asarray(valor) for valor in (presupuesto, trabajadores, duracion, retraso_inicio, retraso_final, complejidad, productividad))
+    )
+    presupuesto, trabajadores, duracion = (np.ravel(v).astype(float) for v in (presupuesto, trabajadores, duracion))
+    complejidad = np.ravel(complejidad)
+
+    features = pd.DataFrame({
+        "Presupuesto": presupuesto,
+        "NumTrabajadores": trabajadores,
+        "RetrasoInicioDias": np.ravel(retraso_inicio).astype(float),
+        "RetrasoFinalDias": np.ravel(retraso_final).astype(float),
+        "ProductividadPromedio": np.ravel(productividad).astype(float),
+    })[COLUMNAS_FEATURES]
+    defectos = np.asarray(modelo.predict(features), dtype=float)
+
+    factores = pd.Series(complejidad).map(FACTORES_COMPLEJIDAD).fillna(0.33).to_numpy(dtype=float)
+    sigma = duracion * factores
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tasa = defectos / (trabajadores * (duracion / 7))
+    # NaN no cumple ningún umbral y queda en "Alto", igual que clasificar_nivel_riesgo
+    codigo_riesgo = np.select([tasa < UMBRALES_RIESGO[0], tasa < UMBRALES_RIESGO[1]], [0, 1], default=2)
+
+    tiempo = np.arange(int(duracion.max(initial=0)) + 1, dtype=float)
+    curvas = defectos[:, None] * rayleigh_cdf(tiempo[None, :], sigma[:, None])
+    curvas[tiempo[None, :] > duracion[:, None]] = np.nan
+
+    return {
+        "defectos": defectos,
+        "duracion": duracion,
+        "sigma": sigma,
+        "tasa": tasa,
+        "nivel": NIVELES_RIESGO[codigo_riesgo],
+        "codigo_riesgo": codigo_riesgo,
+        "tiempo": tiempo,
+        "curvas": curvas,
+    }
+
+
+def superficie_sensibilidad(
+    modelo,
+    eje_x: str,
+    valores_x,
+    eje_y: str,
+    valores_y,
+    base: dict,
+    duracion: int,
+    complejidad: str = "media",
+) -> dict:
+    """
+    Evalúa el modelo sobre una grilla de dos features, manteniendo el resto en `base`
+
+    Toda la grilla se predice con una sola llamada a modelo.predict; el pico de la
+    curva de Rayleigh (en t = sigma) se obtiene en forma cerrada para cada celda.
+
+    Args:
+        modelo: Modelo entrenado (ver entrenar_modelo)
+        eje_x, eje_y: Features de COLUMNAS_FEATURES a barrer (distintas)
+        valores_x, valores_y: Valores de cada eje
+        base: Valor de cada feature de COLUMNAS_FEATURES fuera de los ejes
+        duracion: Duración del proyecto en SEMANAS
+        complejidad: "baja", "media" o "alta" (define la semana pico)
+
+    Returns:
+        Diccionario con:
+        - x: (nx,), y: (ny,)
+        - defectos: (ny, nx) defectos totales predichos
+        - defectos_pico: (ny, nx) defectos por semana en la semana pico
+        - semana_pico: semana en que ocurre el pico (sigma)
+    """
+    valores_x = np.asarray(valores_x, dtype=float)
+    valores_y = np.asarray(valores_y, dtype=float)
+    grilla_x, grilla_y = np.meshgrid(valores_x, valores_y)
+
+    columnas = {col: np.full(grilla_x.size, float(base[col])) for col in COLUMNAS_FEATURES}
+    columnas[eje_x] = grilla_x.ravel()
+    columnas[eje_y] = grilla_y.ravel()
+    defectos = np.asarray(modelo.predict(pd.DataFrame(columnas)[COLUMNAS_FEATURES]), dtype=float).reshape(grilla_x.shape)
+
+    # La densidad de Rayleigh alcanza su máximo en t = sigma
+    sigma = calcular_sigma(duracion, complejidad)
+    defectos_pico = defectos * rayleigh_pdf(sigma, sigma)
+
+    return {
+        "x": valores_x,
+        "y": valores_y,
+        "defectos": defectos,
+        "defectos_pico": defectos_pico,
+        "semana_pico": sigma,
+    }
+
+
 def generar_recomendaciones(
     defectos: float,
     trabajadores: int,
@@ -244,72 +487,119 @@ def generar_recomendaciones(
     return recomendaciones
 
 
-def generar_plan_testing(defectos: float, duracion: int, curva: pd.DataFrame) -> pd.DataFrame:
+def _plan_desde_curvas(defectos, acumulados, duracion, periodo: str) -> pd.DataFrame:
+    """
+    Plan de testing por periodo de muchas curvas a la vez
+
+    Args:
+        defectos: (n,) defectos totales de cada curva
+        acumulados: (n, T) defectos acumulados en las semanas 0..T-1
+        duracion: (n,) semanas de cada curva (se recorta a T-1)
+        periodo: Clave de PERIODOS_PLAN
+
+    Returns:
+        DataFrame largo con una fila por (curva, periodo) y columnas Curva, Periodo,
+        Desde Semana, Hasta Semana, Defectos Esperados, Esfuerzo QA y Recursos Sugeridos
+    """
+    semanas_periodo = PERIODOS_PLAN[periodo]
+    defectos = np.asarray(defectos, dtype=float)
+    acumulados = np.asarray(acumulados, dtype=float)
+    duracion = np.clip(np.asarray(duracion).astype(np.int64), 0, acumulados.shape[1] - 1)
+
+    # Bordes de cada periodo en semanas; el último periodo de cada curva puede quedar incompleto
+    periodos = -(-int(duracion.max(initial=0)) // semanas_periodo)
+    bordes = np.arange(periodos + 1, dtype=np.int64) * semanas_periodo
+    inicio = np.minimum(bordes[None, :-1], duracion[:, None])
+    fin = np.minimum(bordes[None, 1:], duracion[:, None])
+    defectos_periodo = np.take_along_axis(acumulados, fin, axis=1) - np.take_along_axis(acumulados, inicio, axis=1)
+
+    # Los umbrales semanales escalan con las semanas del periodo
+    semanas = fin - inicio
+    umbral_alto, umbral_medio = (defectos[:, None] * umbral * semanas for umbral in UMBRALES_ESFUERZO_QA)
+    codigo = np.select([defectos_periodo > umbral_alto, defectos_periodo > umbral_medio], [0, 1], default=2)
+
+    curva, columna = np.nonzero(semanas > 0)
+    return pd.DataFrame({
+        "Curva": curva,
+        "Periodo": columna + 1,
+        "Desde Semana": inicio[curva, columna] + 1,
+        "Hasta Semana": fin[curva, columna],
+        "Defectos Esperados": defectos_periodo[curva, columna],
+        "Esfuerzo QA": pd.Categorical.from_codes(codigo[curva, columna], dtype=ESFUERZOS_QA),
+        "Recursos Sugeridos": pd.Categorical.from_codes(codigo[curva, columna], dtype=RECURSOS_QA),
+    })
+
+
+def generar_plan_testing(defectos: float, duracion: int, curva: pd.DataFrame, periodo: str = "semana") -> pd.DataFrame:
     """
     Genera un plan de testing sugerido basado en la curva de Rayleigh
+
+    Args:
+        defectos: Defectos totales esperados
+        duracion: Duración del proyecto en SEMANAS
+        curva: Curva de rayleigh_curve (un punto por semana)
+        periodo: "semana", "sprint" (2 semanas) o "mes" (4 semanas)
+
+    Returns:
+        DataFrame con una fila por periodo: número de periodo (columna Semana, Sprint
+        o Mes), semanas que cubre, defectos esperados, esfuerzo y recursos de QA
     """
-    semanas = int(duracion / 7)
-    plan = []
-    
-    for semana in range(1, semanas + 1):
-        tiempo_semana = semana * 7
-        idx = min(int(tiempo_semana), len(curva) - 1)
-        
-        defectos_acumulados = curva.iloc[idx]["DefectosAcumulados"]
-        defectos_semana = defectos_acumulados - (curva.iloc[max(0, idx - 7)]["DefectosAcumulados"] if idx > 7 else 0)
-        
-        # Calcular esfuerzo de QA sugerido (proporción a defectos esperados)
-        if defectos_semana > defectos * 0.15:  # Más del 15% en una semana
-            esfuerzo = "Alto"
-            recursos_qa = "2-3 QA"
-        elif defectos_semana > defectos * 0.08:
-            esfuerzo = "Medio"
-            recursos_qa = "1-2 QA"
-        else:
-            esfuerzo = "Bajo"
-            recursos_qa = "1 QA"
-        
-        plan.append({
-            "Semana": semana,
-            "Defectos Esperados": f"{defectos_semana:.1f}",
-            "Esfuerzo QA": esfuerzo,
-            "Recursos Sugeridos": recursos_qa
-        })
-    
-    return pd.DataFrame(plan)
+    plan = _plan_desde_curvas(
+        [defectos], curva["DefectosAcumulados"].to_numpy(dtype=float)[None, :], [duracion], periodo
+    )
+    return plan.drop(columns="Curva").rename(columns={"Periodo": periodo.capitalize()})
+
+
+def generar_planes_testing(escenarios: dict, periodo: str = "semana") -> pd.DataFrame:
+    """
+    Planes de testing de todos los escenarios de predecir_escenarios en una sola pasada
+
+    Args:
+        escenarios: Resultado de predecir_escenarios
+        periodo: "semana", "sprint" (2 semanas) o "mes" (4 semanas)
+
+    Returns:
+        DataFrame largo con columna Escenario (posición en los arrays de entrada) y las
+        columnas de generar_plan_testing
+    """
+    plan = _plan_desde_curvas(escenarios["defectos"], escenarios["curvas"], escenarios["duracion"], periodo)
+    return plan.rename(columns={"Curva": "Escenario", "Periodo": periodo.capitalize()})
 
 
 def buscar_proyectos_similares(
     df_proyectos: pd.DataFrame,
     presupuesto: float,
     trabajadores: int,
-    complejidad: str
+    complejidad: str,
+    retraso_inicio: Optional[float] = None,
+    retraso_final: Optional[float] = None,
+    productividad: Optional[float] = None,
+    errores: Optional[float] = None,
+    k: int = 5,
 ) -> pd.DataFrame:
     """
-    Busca proyectos históricos con características similares
+    Busca los k proyectos históricos más parecidos (vecinos más cercanos, ver dss/similitud.py)
+
+    Las características no indicadas (None) se comparan contra la mediana histórica.
+
+    Returns:
+        DataFrame de los proyectos similares, del más cercano al más lejano, con su
+        Desviacion% presupuestal y la Distancia en el espacio estandarizado
     """
-    # Filtrar por rango de presupuesto (+/- 30%)
-    presupuesto_min = presupuesto * 0.7
-    presupuesto_max = presupuesto * 1.3
-    
-    similares = df_proyectos[
-        (df_proyectos["Presupuesto"] >= presupuesto_min) &
-        (df_proyectos["Presupuesto"] <= presupuesto_max) &
-        (df_proyectos["NumTrabajadores"] >= trabajadores - 2) &
-        (df_proyectos["NumTrabajadores"] <= trabajadores + 2)
-    ].copy()
-    
-    if len(similares) > 0:
-        similares = similares[[
-            "CodigoProyecto",
-            "Presupuesto",
-            "CosteReal",
-            "NumTrabajadores",
-            "TotalErrores",
-            "RetrasoFinalDias",
-            "ProductividadPromedio"
-        ]].head(5)
-        
-        similares["Desviacion%"] = ((similares["CosteReal"] - similares["Presupuesto"]) / similares["Presupuesto"] * 100).round(2)
-    
+    indice = obtener_indice_similitud(df_proyectos)
+    posiciones, distancias = indice.consultar(
+        {
+            "Presupuesto": presupuesto,
+            "NumTrabajadores": trabajadores,
+            "RetrasoInicioDias": retraso_inicio,
+            "RetrasoFinalDias": retraso_final,
+            "ProductividadPromedio": productividad,
+            "TotalErrores": errores,
+        },
+        k,
+    )
+
+    similares = df_proyectos[COLUMNAS_RESULTADO].take(posiciones)
+    similares["Desviacion%"] = ((similares["CosteReal"] - similares["Presupuesto"]) / similares["Presupuesto"] * 100).round(2)
+    similares["Distancia"] = distancias.round(3)
     return similares
@@ -0,0 +1,194 @@
+"""
+Registro persistente y versionado de modelos entrenados
+
+Cada modelo se guarda con joblib junto a sus metadatos (huella de los datos de
+entrenamiento, features, métricas, versión de scikit-learn) en un manifiesto.
+Al arrancar se reutiliza el modelo registrado para la huella de los datos
+actuales, de modo que sólo se reentrena cuando cambian los datos del DWH y
+todos los pods que comparten el directorio predicen con el mismo modelo.
+
+Varios procesos pueden registrar a la vez (la app, el servicio HTTP y
+`python -m dss.seleccion_modelos`): cada registro lee, modifica y reescribe el
+manifiesto bajo un lock de archivo en el directorio, y lo reemplaza de forma
+atómica, así los lectores nunca ven un manifiesto a medio escribir.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+import pandas as pd
+import sklearn
+import streamlit as st
+
+from .config import MODELOS_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MANIFIESTO = "modelos.json"
+BLOQUEO = "modelos.lock"
+
+
+def huella_datos(df: pd.DataFrame, columnas: List[str]) -> str:
+    """
+    Huella del contenido de las columnas de entrenamiento (independiente del orden de filas)
+
+    Args:
+        df: DataFrame de entrenamiento
+        columnas: Columnas que usa el modelo (features y target)
+
+    Returns:
+        Hash hexadecimal de 16 caracteres
+    """
+    datos = df[columnas].astype("float64")
+    filas = pd.util.hash_pandas_object(datos, index=False).to_numpy()
+    contenido = hashlib.sha1(",".join(columnas).encode())
+    contenido.update(pd.Series(filas).sort_values().to_numpy().tobytes())
+    return contenido.hexdigest()[:16]
+
+
+class RegistroModelos:
+    """Almacén de modelos versionados en disco con su manifiesto de metadatos"""
+
+    def __init__(self, directorio: str):
+        self.directorio = Path(directorio)
+        self._lock = threading.Lock()
+
+    def registrar(
+        self,
+        nombre: str,
+        modelo,
+        huella: str,
+        features: List[str],
+        metricas: Dict[str, object],
+        filas: int,
+        extra: Optional[Dict[str, object]] = None,
+    ) -> Dict[str, object]:
+        """
+        Guarda un modelo como nueva versión de `nombre`
+
+        Args:
+            nombre: Nombre del modelo (p. ej. "defectos")
+            modelo: Estimador entrenado
+            huella: Huella de los datos de entrenamiento (ver huella_datos)
+            features: Columnas de entrada en el orden de entrenamiento
+            metricas: Métricas de desempeño (ver obtener_metricas_modelo)
+            filas: Filas de entrenamiento
+            extra: Metadatos adicionales
+
+        Returns:
+            Metadatos de la versión registrada
+        """
+        with self._bloqueo():
+            manifiesto = self._leer_manifiesto()
+            versiones = manifiesto.setdefault(nombre, [])
+            version = max((entrada["version"] for entrada in versiones), default=0) + 1
+            archivo = self.directorio / f"{nombre}-v{version:04d}.joblib"
+
+            temporal = archivo.with_suffix(".joblib.tmp")
+            joblib.dump(modelo, temporal)
+            os.replace(temporal, archivo)
+
+            entrada = {
+                "version": version,
+                "archivo": archivo.name,
+                "huella": huella,
+                "features": list(features),
+                "metricas": {clave: _a_json(valor) for clave, valor in metricas.items()},
+                "filas": int(filas),
+                "estimador": type(modelo).__name__,
+                "sklearn": sklearn.__version__,
+                "entrenado": datetime.now().isoformat(timespec="seconds"),
+                **(extra or {}),
+            }
+            versiones.append(entrada)
+            self._guardar_manifiesto(manifiesto)
+            return entrada
+
+    def cargar(self, nombre: str, huella: Optional[str] = None) -> Optional[Tuple[object, Dict[str, object]]]:
+        """
+        Carga la última versión de `nombre`, o la última entrenada con datos de huella `huella`
+
+        Returns:
+            (modelo, metadatos) o None si no hay versión registrada (o no se puede leer)
+        """
+        candidatas = [
+            entrada for entrada in self.versiones(nombre)
+            if huella is None or entrada["huella"] == huella
+        ]
+        for entrada in reversed(candidatas):
+            try:
+                return joblib.load(self.directorio / entrada["archivo"]), entrada
+            except Exception as e:
+                print(f"⚠️ Modelo {entrada['archivo']} ilegible: {e}")
+        return None
+
+    def versiones(self, nombre: str) -> List[Dict[str, object]]:
+        """Metadatos de todas las versiones registradas de `nombre`, de la más antigua a la más reciente"""
+        return sorted(self._leer_manifiesto().get(nombre, []), key=lambda entrada: entrada["version"])
+
+    @contextlib.contextmanager
+    def _bloqueo(self):
+        # Exclusión entre hilos (threading.Lock) y entre procesos que comparten el directorio (lock de archivo)
+        with self._lock:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            with open(self.directorio / BLOQUEO, "a+b") as archivo:
+                _bloquear_archivo(archivo)
+                try:
+                    yield
+                finally:
+                    _desbloquear_archivo(archivo)
+
+    def _guardar_manifiesto(self, manifiesto: dict):
+        ruta = self.directorio / MANIFIESTO
+        temporal = ruta.with_suffix(".json.tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, indent=2, ensure_ascii=False)
+        os.replace(temporal, ruta)
+
+    def _leer_manifiesto(self) -> dict:
+        ruta = self.directorio / MANIFIESTO
+        if not ruta.exists():
+            return {}
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+def _bloquear_archivo(archivo):
+    # Bloqueante: espera a que el otro proceso termine de registrar
+    if fcntl is not None:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+    else:
+        archivo.seek(0)
+        msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _desbloquear_archivo(archivo):
+    if fcntl is not None:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
+    else:
+        archivo.seek(0)
+        msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _a_json(valor):
+    # Métricas numpy (float64, int64) a tipos nativos para el manifiesto
+    return valor.item() if hasattr(valor, "item") else valor
+
+
+@st.cache_resource
+def get_registro_modelos() -> RegistroModelos:
+    """Retorna el registro de modelos compartido por todas las sesiones"""
+    return RegistroModelos(MODELOS_DIR)
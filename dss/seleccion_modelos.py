@@ -0,0 +1,188 @@
+"""
+Selección de modelo de defectos por validación cruzada
+
+Evalúa varios regresores (lineal, ridge, gradient boosting y GLM de Poisson)
+con k-fold, en paralelo entre núcleos (joblib), y registra el ganador según el
+RMSE fuera de fold en el registro de modelos (dss/registro_modelos.py), desde
+donde lo toma la pestaña de predicción. El entrenamiento corre en un hilo en
+segundo plano para no bloquear la interfaz; también puede ejecutarse offline:
+
+    python -m dss.seleccion_modelos
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.linear_model import LinearRegression, PoissonRegressor, Ridge
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import KFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from .prediction import COLUMNAS_FEATURES, NOMBRE_MODELO, limpiar_modelos_en_memoria, preparar_features_target
+from .registro_modelos import get_registro_modelos, huella_datos
+
+# Regresores candidatos (los lineales sobre features estandarizadas)
+CANDIDATOS = {
+    "Lineal": LinearRegression(),
+    "Ridge": make_pipeline(StandardScaler(), Ridge(alpha=1.0)),
+    "Gradient Boosting": GradientBoostingRegressor(n_estimators=200, max_depth=3, learning_rate=0.05, random_state=0),
+    "Poisson GLM": make_pipeline(StandardScaler(), PoissonRegressor(alpha=1e-3, max_iter=1000)),
+}
+
+FOLDS = 5
+
+
+def _ajustar_fold(nombre: str, estimador, X: np.ndarray, y: np.ndarray, entrenamiento, prueba):
+    inicio = time.perf_counter()
+    modelo = clone(estimador).fit(X[entrenamiento], y[entrenamiento])
+    segundos = time.perf_counter() - inicio
+    return nombre, prueba, modelo.predict(X[prueba]), segundos
+
+
+def evaluar_candidatos(df_proyectos: pd.DataFrame, folds: int = FOLDS, n_jobs: int = -1) -> pd.DataFrame:
+    """
+    Calcula métricas fuera de fold (k-fold) de cada candidato, ajustando los folds en paralelo
+
+    Args:
+        df_proyectos: Histórico de proyectos con features y TotalErrores
+        folds: Cantidad de folds (se reduce si hay menos proyectos)
+        n_jobs: Procesos de joblib (-1 = todos los núcleos)
+
+    Returns:
+        DataFrame con Modelo, R2, RMSE, MAE y Segundos (entrenamiento total), ordenado por RMSE
+    """
+    features, target = preparar_features_target(df_proyectos.dropna(subset=COLUMNAS_FEATURES + ["TotalErrores"]))
+    X = features.to_numpy(dtype=float)
+    y = target.to_numpy(dtype=float)
+    divisiones = list(KFold(n_splits=min(folds, len(y)), shuffle=True, random_state=0).split(X))
+
+    resultados = Parallel(n_jobs=n_jobs)(
+        delayed(_ajustar_fold)(nombre, estimador, X, y, entrenamiento, prueba)
+        for nombre, estimador in CANDIDATOS.items()
+        for entrenamiento, prueba in divisiones
+    )
+
+    predicciones = {nombre: np.empty_like(y) for nombre in CANDIDATOS}
+    segundos = dict.fromkeys(CANDIDATOS, 0.0)
+    for nombre, prueba, prediccion, tiempo in resultados:
+        predicciones[nombre][prueba] = prediccion
+        segundos[nombre] += tiempo
+
+    filas = [
+        {
+            "Modelo": nombre,
+            "R2": r2_score(y, prediccion),
+            "RMSE": float(np.sqrt(mean_squared_error(y, prediccion))),
+            "MAE": mean_absolute_error(y, prediccion),
+            "Segundos": round(segundos[nombre], 4),
+        }
+        for nombre, prediccion in predicciones.items()
+    ]
+    return pd.DataFrame(filas).sort_values("RMSE").reset_index(drop=True)
+
+
+def seleccionar_y_publicar(df_proyectos: pd.DataFrame, folds: int = FOLDS, n_jobs: int = -1) -> Dict[str, object]:
+    """
+    Evalúa los candidatos, reentrena el ganador con todos los datos y lo registra
+
+    Returns:
+        Metadatos de la versión registrada (incluye la tabla de la selección)
+    """
+    resultados = evaluar_candidatos(df_proyectos, folds, n_jobs)
+    ganador = resultados.iloc[0]
+
+    datos = df_proyectos.dropna(subset=COLUMNAS_FEATURES + ["TotalErrores"])
+    features, target = preparar_features_target(datos)
+    modelo = clone(CANDIDATOS[ganador["Modelo"]]).fit(features, target)
+
+    metricas = {
+        "r2": ganador["R2"],
+        "rmse": ganador["RMSE"],
+        "mae": ganador["MAE"],
+        "confianza": "Alta" if ganador["R2"] > 0.7 else "Media" if ganador["R2"] > 0.5 else "Baja",
+    }
+    entrada = get_registro_modelos().registrar(
+        NOMBRE_MODELO,
+        modelo,
+        huella_datos(df_proyectos, COLUMNAS_FEATURES + ["TotalErrores"]),
+        COLUMNAS_FEATURES,
+        metricas,
+        len(datos),
+        extra={
+            "validacion": f"{min(folds, len(datos))}-fold fuera de fold",
+            "seleccion": resultados.round(4).to_dict(orient="records"),
+        },
+    )
+    # La pestaña de predicción toma el ganador en su próxima ejecución
+    limpiar_modelos_en_memoria()
+    return entrada
+
+
+class EntrenamientoEnSegundoPlano:
+    """Estado de la última selección de modelo lanzada en un hilo aparte"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self.estado = "sin iniciar"
+        self.inicio: Optional[str] = None
+        self.segundos: Optional[float] = None
+        self.resultado: Optional[Dict[str, object]] = None
+        self.error: Optional[str] = None
+
+    @property
+    def en_curso(self) -> bool:
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self, df_proyectos: pd.DataFrame) -> bool:
+        """
+        Lanza la selección en segundo plano si no hay otra en curso
+
+        Returns:
+            True si se lanzó, False si ya había una en curso
+        """
+        with self._lock:
+            if self.en_curso:
+                return False
+            self.estado = "en curso"
+            self.inicio = datetime.now().isoformat(timespec="seconds")
+            self.resultado, self.error, self.segundos = None, None, None
+            self._hilo = threading.Thread(
+                target=self._ejecutar, args=(df_proyectos,), name="seleccion-modelos", daemon=True
+            )
+            self._hilo.start()
+            return True
+
+    def _ejecutar(self, df_proyectos: pd.DataFrame):
+        inicio = time.perf_counter()
+        try:
+            self.resultado = seleccionar_y_publicar(df_proyectos)
+            self.estado = "listo"
+        except Exception as e:
+            print(f"⚠️ Falló la selección de modelo: {e}")
+            self.error = str(e)
+            self.estado = "error"
+        finally:
+            self.segundos = round(time.perf_counter() - inicio, 2)
+
+
+@st.cache_resource
+def get_entrenamiento() -> EntrenamientoEnSegundoPlano:
+    """Retorna el estado de entrenamiento compartido por todas las sesiones"""
+    return EntrenamientoEnSegundoPlano()
+
+
+if __name__ == "__main__":
+    from .data_sources import cargar_df_proyectos
+
+    entrada = seleccionar_y_publicar(cargar_df_proyectos())
+    print(pd.DataFrame(entrada["seleccion"]).to_string(index=False))
+    print(f"✅ Modelo registrado: {entrada['archivo']} ({entrada['estimador']})")
@@ -0,0 +1,365 @@
+"""
+Servicio HTTP (ASGI) de predicción de defectos
+
+Expone el modelo de dss/prediction.py para que otras herramientas (p. ej. las de
+la PMO) evalúen proyectos sin pasar por el dashboard:
+
+    POST /prediccion   escenarios -> defectos, nivel de riesgo y (opcional) curva de Rayleigh
+    POST /curva        defectos + duración -> curva acumulada e incrementos semanales
+    POST /riesgo       defectos + equipo + duración -> nivel de riesgo
+    GET  /salud        versión del modelo cargado
+    GET  /metricas     latencias p50/p99 por ruta y tamaño de los lotes
+
+El modelo se carga una sola vez al arrancar (última versión del registro, o se
+entrena con el DWH si el registro está vacío). Los escenarios de solicitudes
+concurrentes se agrupan durante DSS_SERVICIO_LOTE_MS milisegundos y se evalúan
+con una sola llamada vectorizada a predecir_escenarios. Se ejecuta con:
+
+    python -m dss.servicio
+"""
+import asyncio
+import contextlib
+import functools
+import time
+from collections import Counter, defaultdict, deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from .config import MODELOS_DIR, SERVICIO_HOST, SERVICIO_LOTE_MAX, SERVICIO_LOTE_MS, SERVICIO_PUERTO
+from .prediction import (
+    FACTORES_COMPLEJIDAD,
+    NOMBRE_MODELO,
+    calcular_sigma,
+    clasificar_nivel_riesgo,
+    incrementos_rayleigh,
+    predecir_escenarios,
+    rayleigh_curve,
+)
+from .registro_modelos import RegistroModelos
+
+# Campos de cada escenario (argumentos de predecir_escenarios) y su valor por defecto (None = obligatorio)
+CAMPOS_ESCENARIO = {
+    "presupuesto": None,
+    "trabajadores": None,
+    "duracion": None,
+    "retraso_inicio": 0,
+    "retraso_final": 0,
+    "complejidad": "media",
+    "productividad": 0.75,
+}
+
+# Duración máxima aceptada (semanas); acota el ancho de las curvas de cada lote
+DURACION_MAXIMA = 520
+
+# Latencias que se conservan por ruta para calcular percentiles
+MUESTRAS_LATENCIA = 2048
+
+
+class ErrorSolicitud(ValueError):
+    """Cuerpo de solicitud inválido (se responde con 400)"""
+
+
+def _numero(valor) -> Optional[float]:
+    # JSON no admite NaN ni infinito
+    valor = float(valor)
+    return valor if np.isfinite(valor) else None
+
+
+def _leer_numero(datos: dict, campo: str, defecto=None, entero: bool = False, minimo: Optional[float] = None):
+    valor = datos.get(campo, defecto)
+    if valor is None:
+        raise ErrorSolicitud(f"Falta '{campo}'")
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        raise ErrorSolicitud(f"'{campo}' debe ser numérico") from None
+    if not np.isfinite(numero) or (entero and not numero.is_integer()):
+        raise ErrorSolicitud(f"'{campo}' debe ser un número {'entero' if entero else 'finito'}")
+    if minimo is not None and numero < minimo:
+        raise ErrorSolicitud(f"'{campo}' debe ser mayor o igual a {minimo}")
+    return int(numero) if entero else numero
+
+
+def _leer_duracion(datos: dict) -> int:
+    duracion = _leer_numero(datos, "duracion", entero=True, minimo=1)
+    if duracion > DURACION_MAXIMA:
+        raise ErrorSolicitud(f"'duracion' no puede superar {DURACION_MAXIMA} semanas")
+    return duracion
+
+
+def _leer_complejidad(datos: dict) -> str:
+    complejidad = datos.get("complejidad", "media")
+    # Se valida el tipo antes de buscarlo: una lista u objeto JSON no es hashable
+    if not isinstance(complejidad, str) or complejidad not in FACTORES_COMPLEJIDAD:
+        raise ErrorSolicitud(f"'complejidad' debe ser una de {list(FACTORES_COMPLEJIDAD)}")
+    return complejidad
+
+
+def leer_escenarios(cuerpo) -> Dict[str, np.ndarray]:
+    """
+    Valida {"escenarios": [{...}, ...]} y lo convierte a columnas para predecir_escenarios
+
+    Raises:
+        ErrorSolicitud: Si falta un campo obligatorio o algún valor es inválido
+    """
+    escenarios = cuerpo.get("escenarios") if isinstance(cuerpo, dict) else None
+    if not isinstance(escenarios, list) or not escenarios:
+        raise ErrorSolicitud("Se esperaba {'escenarios': [...]} con al menos un escenario")
+
+    columnas = {campo: [] for campo in CAMPOS_ESCENARIO}
+    for i, escenario in enumerate(escenarios):
+        if not isinstance(escenario, dict):
+            raise ErrorSolicitud(f"Escenario {i}: se esperaba un objeto")
+        try:
+            columnas["presupuesto"].append(_leer_numero(escenario, "presupuesto"))
+            columnas["trabajadores"].append(_leer_numero(escenario, "trabajadores", minimo=1))
+            columnas["duracion"].append(_leer_duracion(escenario))
+            columnas["retraso_inicio"].append(_leer_numero(escenario, "retraso_inicio", 0))
+            columnas["retraso_final"].append(_leer_numero(escenario, "retraso_final", 0))
+            columnas["complejidad"].append(_leer_complejidad(escenario))
+            columnas["productividad"].append(_leer_numero(escenario, "productividad", 0.75))
+        except ErrorSolicitud as e:
+            raise ErrorSolicitud(f"Escenario {i}: {e}") from None
+    return {campo: np.asarray(valores) for campo, valores in columnas.items()}
+
+
+class LotePredicciones:
+    """Agrupa los escenarios de solicitudes concurrentes y los evalúa con una sola predicción"""
+
+    def __init__(self, modelo, espera_ms: float = SERVICIO_LOTE_MS, maximo: int = SERVICIO_LOTE_MAX):
+        self.modelo = modelo
+        self.espera = espera_ms / 1000
+        self.maximo = maximo
+        self.tamanos: deque = deque(maxlen=MUESTRAS_LATENCIA)
+        self._cola: Optional[asyncio.Queue] = None
+        self._tarea: Optional[asyncio.Task] = None
+
+    def iniciar(self):
+        self._cola = asyncio.Queue()
+        self._tarea = asyncio.create_task(self._procesar())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._tarea
+
+    async def predecir(self, columnas: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Encola los escenarios y espera sus resultados (mismas claves que predecir_escenarios)"""
+        futuro = asyncio.get_running_loop().create_future()
+        await self._cola.put((columnas, futuro))
+        return await futuro
+
+    async def _siguiente_lote(self) -> List[Tuple[Dict[str, np.ndarray], asyncio.Future]]:
+        pendientes = [await self._cola.get()]
+        escenarios = len(pendientes[0][0]["duracion"])
+        limite = asyncio.get_running_loop().time() + self.espera
+        while escenarios < self.maximo:
+            restante = limite - asyncio.get_running_loop().time()
+            if restante <= 0:
+                break
+            try:
+                pendiente = await asyncio.wait_for(self._cola.get(), restante)
+            except asyncio.TimeoutError:
+                break
+            pendientes.append(pendiente)
+            escenarios += len(pendiente[0]["duracion"])
+        return pendientes
+
+    async def _procesar(self):
+        while True:
+            pendientes = await self._siguiente_lote()
+            try:
+                await self._resolver(pendientes)
+            except Exception as e:
+                # Un lote fallido se informa a sus solicitudes sin detener el procesamiento de los siguientes
+                for _, futuro in pendientes:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+
+    async def _resolver(self, pendientes: List[Tuple[Dict[str, np.ndarray], asyncio.Future]]):
+        columnas = {campo: np.concatenate([c[campo] for c, _ in pendientes]) for campo in CAMPOS_ESCENARIO}
+        # La predicción corre en un hilo para no bloquear el event loop
+        resultado = await asyncio.to_thread(predecir_escenarios, self.modelo, **columnas)
+        self.tamanos.append(len(columnas["duracion"]))
+
+        inicio = 0
+        for c, futuro in pendientes:
+            fin = inicio + len(c["duracion"])
+            if not futuro.done():
+                parte = {clave: valor[inicio:fin] for clave, valor in resultado.items() if clave != "tiempo"}
+                futuro.set_result(parte)
+            inicio = fin
+
+
+def cargar_modelo() -> Tuple[object, Dict[str, object]]:
+    """
+    Retorna (modelo, metadatos) de la última versión registrada; si el registro está
+    vacío entrena uno con los proyectos del DWH (ver entrenar_modelo)
+    """
+    cargado = RegistroModelos(MODELOS_DIR).cargar(NOMBRE_MODELO)
+    if cargado is not None:
+        return cargado
+
+    from .data_sources import cargar_df_proyectos
+    from .prediction import entrenar_modelo, metadatos_modelo
+
+    df_proyectos = cargar_df_proyectos()
+    return entrenar_modelo(df_proyectos), metadatos_modelo(df_proyectos) or {}
+
+
+def _medido(endpoint):
+    """Registra la latencia de cada solicitud y responde 400 ante ErrorSolicitud"""
+
+    @functools.wraps(endpoint)
+    async def envoltura(request: Request):
+        inicio = time.perf_counter()
+        try:
+            try:
+                cuerpo = await request.json() if request.method == "POST" else None
+            except ValueError:
+                raise ErrorSolicitud("El cuerpo debe ser JSON") from None
+            return await endpoint(request, cuerpo)
+        except ErrorSolicitud as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        finally:
+            estado = request.app.state
+            estado.solicitudes[request.url.path] += 1
+            estado.latencias[request.url.path].append((time.perf_counter() - inicio) * 1000)
+
+    return envoltura
+
+
+@_medido
+async def prediccion(request: Request, cuerpo) -> JSONResponse:
+    columnas = leer_escenarios(cuerpo)
+    incluir_curvas = bool(cuerpo.get("curvas", False))
+    resultado = await request.app.state.lote.predecir(columnas)
+
+    escenarios = []
+    for i in range(len(columnas["duracion"])):
+        escenario = {
+            "defectos": _numero(resultado["defectos"][i]),
+            "sigma": _numero(resultado["sigma"][i]),
+            "tasa": _numero(resultado["tasa"][i]),
+            "nivel": str(resultado["nivel"][i]),
+        }
+        if incluir_curvas:
+            curva = resultado["curvas"][i, : int(columnas["duracion"][i]) + 1]
+            escenario["curva"] = [_numero(valor) for valor in curva]
+        escenarios.append(escenario)
+    return JSONResponse({"modelo": request.app.state.metadatos.get("version"), "escenarios": escenarios})
+
+
+@_medido
+async def curva(request: Request, cuerpo) -> JSONResponse:
+    if not isinstance(cuerpo, dict):
+        raise ErrorSolicitud("Se esperaba un objeto JSON")
+    defectos = _leer_numero(cuerpo, "defectos")
+    duracion = _leer_duracion(cuerpo)
+    if cuerpo.get("sigma") is not None:
+        sigma = _leer_numero(cuerpo, "sigma")
+        if sigma <= 0:
+            raise ErrorSolicitud("'sigma' debe ser mayor que 0")
+    else:
+        sigma = calcular_sigma(duracion, _leer_complejidad(cuerpo))
+
+    tabla = rayleigh_curve(defectos, duracion, sigma)
+    return JSONResponse({
+        "sigma": _numero(sigma),
+        "tiempo": tabla["Tiempo"].tolist(),
+        "acumulados": [_numero(valor) for valor in tabla["DefectosAcumulados"]],
+        "incrementos": [_numero(valor) for valor in incrementos_rayleigh(defectos, duracion, sigma)],
+    })
+
+
+@_medido
+async def riesgo(request: Request, cuerpo) -> JSONResponse:
+    if not isinstance(cuerpo, dict):
+        raise ErrorSolicitud("Se esperaba un objeto JSON")
+    clasificacion = clasificar_nivel_riesgo(
+        _leer_numero(cuerpo, "defectos"),
+        _leer_numero(cuerpo, "trabajadores", minimo=1),
+        _leer_numero(cuerpo, "duracion", minimo=1),
+    )
+    return JSONResponse({**clasificacion, "tasa": _numero(clasificacion["tasa"])})
+
+
+@_medido
+async def salud(request: Request, cuerpo) -> JSONResponse:
+    metadatos = request.app.state.metadatos
+    return JSONResponse({
+        "estado": "ok",
+        "modelo": metadatos.get("version"),
+        "estimador": metadatos.get("estimador"),
+        "entrenado": metadatos.get("entrenado"),
+    })
+
+
+async def metricas(request: Request) -> JSONResponse:
+    estado = request.app.state
+    rutas = {}
+    for ruta, latencias in estado.latencias.items():
+        muestras = np.fromiter(latencias, dtype=float)
+        rutas[ruta] = {
+            "solicitudes": estado.solicitudes[ruta],
+            "p50_ms": round(float(np.percentile(muestras, 50)), 3),
+            "p99_ms": round(float(np.percentile(muestras, 99)), 3),
+        }
+    tamanos = np.fromiter(estado.lote.tamanos, dtype=float)
+    return JSONResponse({
+        "rutas": rutas,
+        "lotes": {
+            "lotes": len(tamanos),
+            "escenarios_promedio": round(float(tamanos.mean()), 2) if len(tamanos) else None,
+            "escenarios_maximo": int(tamanos.max()) if len(tamanos) else None,
+        },
+    })
+
+
+def crear_app(modelo=None, metadatos: Optional[Dict[str, object]] = None) -> Starlette:
+    """
+    Construye la aplicación ASGI
+
+    Args:
+        modelo: Modelo a servir; si es None se carga al arrancar (ver cargar_modelo)
+        metadatos: Metadatos del modelo (versión, estimador, fecha de entrenamiento)
+    """
+
+    @contextlib.asynccontextmanager
+    async def ciclo_de_vida(app: Starlette):
+        if modelo is None:
+            app.state.modelo, app.state.metadatos = await asyncio.to_thread(cargar_modelo)
+        else:
+            app.state.modelo, app.state.metadatos = modelo, metadatos or {}
+        app.state.solicitudes = Counter()
+        app.state.latencias = defaultdict(lambda: deque(maxlen=MUESTRAS_LATENCIA))
+        app.state.lote = LotePredicciones(app.state.modelo)
+        app.state.lote.iniciar()
+        yield
+        await app.state.lote.detener()
+
+    return Starlette(
+        routes=[
+            Route("/prediccion", prediccion, methods=["POST"]),
+            Route("/curva", curva, methods=["POST"]),
+            Route("/riesgo", riesgo, methods=["POST"]),
+            Route("/salud", salud, methods=["GET"]),
+            Route("/metricas", metricas, methods=["GET"]),
+        ],
+        lifespan=ciclo_de_vida,
+    )
+
+
+app = crear_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=SERVICIO_HOST, port=SERVICIO_PUERTO)
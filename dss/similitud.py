@@ -0,0 +1,87 @@
+"""
+Índice de vecinos más cercanos sobre los proyectos históricos
+
+Los proyectos se ubican en un espacio estandarizado (presupuesto en escala
+logarítmica, equipo, retrasos, productividad y errores) y se indexan con un
+KD-tree construido una sola vez por snapshot (ver obtener_indice_similitud).
+Cada consulta retorna los k proyectos más parecidos con su distancia.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from .cache import memo_por_frame
+
+# Features del espacio de similitud
+COLUMNAS_SIMILITUD = [
+    "Presupuesto",
+    "NumTrabajadores",
+    "RetrasoInicioDias",
+    "RetrasoFinalDias",
+    "ProductividadPromedio",
+    "TotalErrores",
+]
+
+# Columnas que se muestran de cada proyecto similar
+COLUMNAS_RESULTADO = [
+    "CodigoProyecto",
+    "Presupuesto",
+    "CosteReal",
+    "NumTrabajadores",
+    "TotalErrores",
+    "RetrasoFinalDias",
+    "ProductividadPromedio",
+]
+
+
+def _transformar(valores: np.ndarray) -> np.ndarray:
+    # El presupuesto se compara en proporción (±30% pesa igual en proyectos chicos y grandes)
+    valores = valores.copy()
+    valores[:, 0] = np.log1p(np.maximum(valores[:, 0], 0.0))
+    return valores
+
+
+class IndiceSimilitud:
+    """KD-tree sobre las features estandarizadas de COLUMNAS_SIMILITUD"""
+
+    def __init__(self, df_proyectos: pd.DataFrame):
+        valores = df_proyectos[COLUMNAS_SIMILITUD].to_numpy(dtype=float)
+        # Los valores faltantes toman la mediana de la columna para que todo proyecto sea comparable
+        self.medianas = np.nan_to_num(np.nanmedian(valores, axis=0)) if len(valores) else np.zeros(len(COLUMNAS_SIMILITUD))
+        valores = np.where(np.isnan(valores), self.medianas, valores)
+
+        espacio = _transformar(valores)
+        self.centro = espacio.mean(axis=0) if len(espacio) else np.zeros(len(COLUMNAS_SIMILITUD))
+        escala = espacio.std(axis=0) if len(espacio) else np.ones(len(COLUMNAS_SIMILITUD))
+        self.escala = np.where(escala > 0, escala, 1.0)
+        self.filas = len(espacio)
+        self._arbol = KDTree((espacio - self.centro) / self.escala) if self.filas else None
+
+    def consultar(self, valores: Dict[str, Optional[float]], k: int = 5):
+        """
+        Busca los k proyectos más cercanos
+
+        Args:
+            valores: Valor de cada feature de COLUMNAS_SIMILITUD (None o ausente = mediana histórica)
+            k: Cantidad de vecinos
+
+        Returns:
+            (posiciones de fila, distancias) ordenadas de la más cercana a la más lejana
+        """
+        k = min(k, self.filas)
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        punto = np.array([
+            self.medianas[i] if valores.get(col) is None or pd.isna(valores.get(col)) else float(valores[col])
+            for i, col in enumerate(COLUMNAS_SIMILITUD)
+        ])
+        punto = (_transformar(punto[None, :]) - self.centro) / self.escala
+        distancias, posiciones = self._arbol.query(punto, k=k)
+        return posiciones[0], distancias[0]
+
+
+def obtener_indice_similitud(df_proyectos: pd.DataFrame) -> IndiceSimilitud:
+    """Retorna el índice de similitud de `df_proyectos`, construyéndolo una sola vez por snapshot"""
+    return memo_por_frame(df_proyectos, "similitud", IndiceSimilitud)
@@ -0,0 +1,232 @@
+"""
+Snapshots locales del Data Warehouse en formato Parquet
+
+Cada DataFrame cargado desde TiDB se persiste en disco junto con un manifiesto
+que guarda la marca de agua (cantidad de filas y ID máximo) de las tablas de
+las que depende. En el siguiente arranque sólo se vuelve a consultar la BD para
+los snapshots cuyas tablas cambiaron; el resto se lee directamente del disco.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+import pandas as pd
+import streamlit as st
+
+from .config import SNAPSHOT_DIR
+from .db_config import DatabaseConfig, execute_query
+
+# Tablas del Data Warehouse y su clave primaria (usada como marca de agua)
+TABLAS_DWH = {
+    "hechos_proyectos": "ID_Hecho",
+    "hechos_asignaciones": "ID_HechoAsignacion",
+    "dim_proyectos": "ID_Proyecto",
+    "dim_clientes": "ID_Cliente",
+    "dim_gastos": "ID_Finanza",
+    "dim_tiempo": "ID_Tiempo",
+    "dim_empleados": "ID_Empleado",
+    "dim_hitos": "ID_Hito",
+    "dim_tareas": "ID_Tarea",
+    "dim_pruebas": "ID_Prueba",
+}
+
+MANIFIESTO = "manifest.json"
+
+
+class SnapshotStore:
+    """Almacén de snapshots Parquet con refresco incremental por marca de agua"""
+
+    def __init__(self, directorio: str):
+        self.directorio = Path(directorio)
+        self._lock = threading.Lock()
+        self._tiempos = {}
+
+    def obtener_marcas(self, tablas: Iterable[str]) -> Dict[str, dict]:
+        """
+        Consulta la marca de agua actual de varias tablas en una sola query
+
+        Args:
+            tablas: Nombres de tablas registradas en TABLAS_DWH
+
+        Returns:
+            Diccionario {tabla: {"filas": int, "max_id": str}}
+        """
+        tablas = sorted(set(tablas))
+        query = " UNION ALL ".join(
+            f"SELECT '{tabla}' AS tabla, COUNT(*) AS filas, MAX({TABLAS_DWH[tabla]}) AS max_id FROM {tabla}"
+            for tabla in tablas
+        )
+        df = execute_query(query)
+        return {
+            fila["tabla"]: {
+                "filas": int(fila["filas"]),
+                "max_id": None if pd.isna(fila["max_id"]) else str(fila["max_id"]),
+            }
+            for _, fila in df.iterrows()
+        }
+
+    def cargar(
+        self,
+        nombre: str,
+        dependencias: Iterable[str],
+        cargador: Callable[[], pd.DataFrame],
+        marcas: Optional[Dict[str, dict]] = None,
+    ) -> pd.DataFrame:
+        """
+        Retorna un DataFrame desde disco si sus tablas no cambiaron; si no, lo recarga
+
+        Args:
+            nombre: Nombre del snapshot (archivo <nombre>.parquet)
+            dependencias: Tablas del DWH de las que se deriva el DataFrame
+            cargador: Función que obtiene el DataFrame desde la BD
+            marcas: Marcas de agua ya consultadas (evita repetir la query)
+
+        Returns:
+            DataFrame del snapshot
+        """
+        inicio = time.perf_counter()
+        dependencias = sorted(set(dependencias))
+        archivo = self.directorio / f"{nombre}.parquet"
+        entrada = self._leer_manifiesto().get(nombre)
+
+        try:
+            if marcas is None or not set(dependencias) <= set(marcas):
+                marcas = self.obtener_marcas(dependencias)
+        except Exception as e:
+            # Sin acceso a la BD: servir el último snapshot conocido si existe
+            if entrada and archivo.exists():
+                print(f"⚠️ Sin conexión a la BD, usando snapshot local de {nombre}: {e}")
+                return self._registrar(nombre, "disco", inicio, pd.read_parquet(archivo))
+            raise
+
+        marcas_actuales = {tabla: marcas[tabla] for tabla in dependencias}
+        if entrada and entrada.get("marcas") == marcas_actuales and archivo.exists():
+            try:
+                return self._registrar(nombre, "disco", inicio, pd.read_parquet(archivo))
+            except Exception as e:
+                print(f"⚠️ Snapshot {nombre} ilegible, recargando desde BD: {e}")
+
+        df = cargador()
+        self._guardar(nombre, archivo, df, marcas_actuales)
+        return self._registrar(nombre, "bd", inicio, df)
+
+    def cargar_tablas(self, tablas: Iterable[str], max_concurrencia: int = 1) -> Dict[str, pd.DataFrame]:
+        """
+        Carga tablas completas del DWH (SELECT *) con una sola consulta de marcas de agua
+
+        Args:
+            tablas: Nombres de tablas registradas en TABLAS_DWH
+            max_concurrencia: Tablas que se leen en paralelo (cada hilo usa su propia conexión del pool)
+
+        Returns:
+            Diccionario {tabla: DataFrame}
+        """
+        tablas = list(tablas)
+        try:
+            marcas = self.obtener_marcas(tablas)
+        except Exception as e:
+            manifiesto = self._leer_manifiesto()
+            if all(tabla in manifiesto and (self.directorio / f"{tabla}.parquet").exists() for tabla in tablas):
+                print(f"⚠️ Sin conexión a la BD, usando snapshots locales: {e}")
+                return {
+                    tabla: self._registrar(tabla, "disco", time.perf_counter(), pd.read_parquet(self.directorio / f"{tabla}.parquet"))
+                    for tabla in tablas
+                }
+            raise
+
+        def cargar_tabla(tabla: str) -> pd.DataFrame:
+            return self.cargar(
+                tabla,
+                [tabla],
+                lambda: execute_query(f"SELECT * FROM {tabla}", columnar=True),
+                marcas,
+            )
+
+        if max_concurrencia <= 1:
+            return {tabla: cargar_tabla(tabla) for tabla in tablas}
+
+        # La latencia total pasa de la suma de los round trips al más lento de cada tanda
+        with ThreadPoolExecutor(max_workers=min(max_concurrencia, len(tablas)), thread_name_prefix="dwh") as pool:
+            futuros = {tabla: pool.submit(cargar_tabla, tabla) for tabla in tablas}
+            return {tabla: futuro.result() for tabla, futuro in futuros.items()}
+
+    def tiempos_de_carga(self, nombres: Iterable[str]) -> pd.DataFrame:
+        """
+        Retorna el origen (bd/disco), filas y segundos de la última carga de cada snapshot
+
+        Args:
+            nombres: Nombres de snapshots
+
+        Returns:
+            DataFrame con columnas Tabla, Origen, Filas y Segundos
+        """
+        registros = [{"Tabla": nombre, **self._tiempos[nombre]} for nombre in nombres if nombre in self._tiempos]
+        return pd.DataFrame(registros, columns=["Tabla", "Origen", "Filas", "Segundos"])
+
+    def _registrar(self, nombre: str, origen: str, inicio: float, df: pd.DataFrame) -> pd.DataFrame:
+        self._tiempos[nombre] = {
+            "Origen": origen,
+            "Filas": len(df),
+            "Segundos": round(time.perf_counter() - inicio, 4),
+        }
+        return df
+
+    def marcas_vigentes(self, tablas: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """
+        Retorna las marcas de agua registradas en el manifiesto para las tablas dadas
+
+        Args:
+            tablas: Nombres de snapshots de tablas
+
+        Returns:
+            Diccionario {tabla: marcas o None si no hay snapshot}
+        """
+        manifiesto = self._leer_manifiesto()
+        return {tabla: manifiesto.get(tabla, {}).get("marcas") for tabla in tablas}
+
+    def _guardar(self, nombre: str, archivo: Path, df: pd.DataFrame, marcas: Dict[str, dict]):
+        try:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            temporal = archivo.with_suffix(".parquet.tmp")
+            df.to_parquet(temporal, index=False)
+            os.replace(temporal, archivo)
+        except Exception as e:
+            # El snapshot es una optimización: si no se puede escribir, se sigue sin él
+            print(f"⚠️ No se pudo guardar el snapshot {nombre}: {e}")
+            return
+
+        with self._lock:
+            manifiesto = self._leer_manifiesto()
+            manifiesto[nombre] = {
+                "archivo": archivo.name,
+                "marcas": marcas,
+                "filas": len(df),
+                "actualizado": datetime.now().isoformat(timespec="seconds"),
+            }
+            ruta = self.directorio / MANIFIESTO
+            temporal = ruta.with_suffix(".json.tmp")
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(manifiesto, f, indent=2, ensure_ascii=False)
+            os.replace(temporal, ruta)
+
+    def _leer_manifiesto(self) -> dict:
+        ruta = self.directorio / MANIFIESTO
+        if not ruta.exists():
+            return {}
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+@st.cache_resource
+def get_snapshot_store() -> SnapshotStore:
+    """Retorna el almacén de snapshots compartido por todas las sesiones"""
+    # Un subdirectorio por backend para no mezclar snapshots de TiDB y de los CSV semilla
+    return SnapshotStore(Path(SNAPSHOT_DIR) / DatabaseConfig().backend)
@@ -1,9 +1,13 @@
+import altair as alt
+import numpy as np
 import pandas as pd
 import streamlit as st
 
-from dss.analytics import build_olap_views, get_detail_table, get_kpis
+from dss.analytics import ContextoAnalitico, aplicar_filtros
 from dss.config import KPI_TARGETS
 from dss.prediction import (
+    COLUMNAS_FEATURES,
+    PERIODOS_PLAN,
     calcular_sigma,
     entrenar_modelo,
     rayleigh_curve,
@@ -11,21 +15,26 @@ from dss.prediction import (
     clasificar_nivel_riesgo,
     generar_recomendaciones,
     generar_plan_testing,
-    buscar_proyectos_similares
+    buscar_proyectos_similares,
+    metadatos_modelo,
+    superficie_sensibilidad,
 )
 from dss.predicciones_simple import generar_todas_predicciones
+from dss.seleccion_modelos import get_entrenamiento
 from dss.okrs import calcular_todos_okrs
 from dss.ui.components import mostrar_tarjeta_kpi
+from dss.metricas_incrementales import generar_dataframe_metricas_recalculadas
 from dss.metricas_calculadas import (
     generar_dataframe_metricas_calculadas,
     obtener_estadisticas_metricas_calculadas,
+    obtener_tiempos_carga_tablas,
     cargar_tablas_completas
 )
 
 
-def render_scorecard(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame, filtros: dict):
-    kpis = get_kpis(df_proyectos, df_asignaciones, filtros)
-    vistas = build_olap_views(df_proyectos, df_asignaciones, filtros)
+def render_scorecard(contexto: ContextoAnalitico):
+    kpis = contexto.kpis
+    vistas = contexto.vistas
     
     # Generar predicciones y recomendaciones
     predicciones = generar_todas_predicciones(kpis, vistas)
@@ -265,10 +274,10 @@ def render_scorecard(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame,
     """, unsafe_allow_html=True)
 
 
-def render_analisis_visual(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame, filtros: dict):
+def render_analisis_visual(contexto: ContextoAnalitico):
     """Vista de análisis visual estratégico con gráficos y visualizaciones clave"""
-    kpis = get_kpis(df_proyectos, df_asignaciones, filtros)
-    vistas = build_olap_views(df_proyectos, df_asignaciones, filtros)
+    kpis = contexto.kpis
+    vistas = contexto.vistas
     
     # Header
     st.markdown("""
@@ -370,9 +379,10 @@ def render_analisis_visual(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataF
             st.info("No hay datos de asignaciones disponibles para el filtro actual.")
 
 
-def render_detalle(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame, filtros: dict):
-    vistas = build_olap_views(df_proyectos, df_asignaciones, filtros)
-    detalle = get_detail_table(df_proyectos, filtros)
+def render_detalle(contexto: ContextoAnalitico):
+    df_proyectos = contexto.df_proyectos
+    vistas = contexto.vistas
+    detalle = contexto.detalle
 
     # Header principal
     st.markdown("""
@@ -397,7 +407,21 @@ def render_detalle(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame, fi
     st.caption("Datos consolidados por proyecto incluyendo tiempos, costos, recursos y desviaciones.")
 
     st.markdown("---")
-    
+
+    # Drill-down / roll-up: KPIs de todas las combinaciones de dimensiones en una sola pasada
+    st.subheader("KPIs por Dimensión")
+    dimensiones = st.multiselect(
+        "Desglosar por",
+        ["anio", "mes", "cliente", "rol"],
+        default=["anio"],
+        format_func={"anio": "Año", "mes": "Mes", "cliente": "Cliente", "rol": "Rol"}.get,
+        key="detalle_kpis_dimensiones",
+    )
+    st.dataframe(contexto.kpis_por(dimensiones), use_container_width=True, height=350)
+    st.caption("Agregar dimensiones hace drill-down y quitarlas roll-up; cada fila equivale a filtrar por esos valores.")
+
+    st.markdown("---")
+
     # Sección de análisis de tiempos y retrasos
     st.subheader("Análisis Temporal y Retrasos")
     st.caption("Evaluación de cumplimiento de plazos y eficiencia de ejecución")
@@ -468,6 +492,7 @@ def render_detalle(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame, fi
                 index="CodigoProyecto",
                 values=["HorasPlanificadas", "HorasReales"],
                 aggfunc="sum",
+                observed=True,
             )
             st.bar_chart(pivot, use_container_width=True, height=400)
             st.caption("Analiza desviaciones operativas para ajustar estimaciones futuras de esfuerzo.")
@@ -585,7 +610,12 @@ def render_prediccion(df_proyectos: pd.DataFrame, kpis: dict):
     """, unsafe_allow_html=True)
 
     modelo = entrenar_modelo(df_proyectos)
-    metricas_modelo = obtener_metricas_modelo(df_proyectos, modelo)
+    # Con un modelo elegido por validación cruzada se muestran sus métricas fuera de fold
+    metadatos = metadatos_modelo(df_proyectos)
+    if metadatos and "validacion" in metadatos:
+        metricas_modelo = metadatos["metricas"]
+    else:
+        metricas_modelo = obtener_metricas_modelo(df_proyectos, modelo)
     
     # Mostrar confianza del modelo
     col_conf1, col_conf2, col_conf3 = st.columns(3)
@@ -597,6 +627,8 @@ def render_prediccion(df_proyectos: pd.DataFrame, kpis: dict):
         confianza_color = "[+]" if metricas_modelo['confianza'] == "Alta" else "[~]" if metricas_modelo['confianza'] == "Media" else "[-]"
         st.metric(f"{confianza_color} Confianza", metricas_modelo['confianza'], help="Nivel de confianza de las predicciones")
 
+    render_seleccion_modelo(df_proyectos, metadatos)
+
     st.divider()
 
     with st.form("prediccion_form", clear_on_submit=False):
@@ -612,6 +644,11 @@ def render_prediccion(df_proyectos: pd.DataFrame, kpis: dict):
         with col3:
             retraso_final = st.number_input("Retraso final esperado (días)", value=0, min_value=0)
             complejidad = st.selectbox("Complejidad del proyecto", ["baja", "media", "alta"], index=1)
+            periodo_plan = st.selectbox(
+                "Plan de testing por",
+                list(PERIODOS_PLAN),
+                format_func={"semana": "Semana", "sprint": "Sprint (2 semanas)", "mes": "Mes (4 semanas)"}.get,
+            )
         
         submitted = st.form_submit_button("Generar Predicción y Recomendaciones", type="primary")
 
@@ -744,23 +781,34 @@ def render_prediccion(df_proyectos: pd.DataFrame, kpis: dict):
         # === SECCIÓN 4: PLAN DE TESTING ===
         st.markdown("---")
         st.subheader("Plan de Testing Sugerido")
-        st.caption("Distribución recomendada de recursos de QA por semana")
+        st.caption(f"Distribución recomendada de recursos de QA por {periodo_plan}")
         
-        plan_testing = generar_plan_testing(pred_defectos, duracion, curva)
+        plan_testing = generar_plan_testing(pred_defectos, duracion, curva, periodo_plan)
         
         # Mostrar tabla sin estilos de color
         st.dataframe(
             plan_testing,
             use_container_width=True,
-            height=300
+            height=300,
+            hide_index=True,
+            column_config={"Defectos Esperados": st.column_config.NumberColumn(format="%.1f")},
         )
         
         # === SECCIÓN 5: PROYECTOS SIMILARES ===
         st.markdown("---")
         st.subheader("Proyectos Históricos Similares")
-        st.caption("Comparación con proyectos que tuvieron características parecidas")
+        st.caption("Los proyectos más parecidos en presupuesto, equipo, retrasos, productividad y defectos (menor distancia = más parecido)")
         
-        similares = buscar_proyectos_similares(df_proyectos, presupuesto, trabajadores, complejidad)
+        similares = buscar_proyectos_similares(
+            df_proyectos,
+            presupuesto,
+            trabajadores,
+            complejidad,
+            retraso_inicio=retraso_inicio,
+            retraso_final=retraso_final,
+            productividad=kpis.get("productividad_promedio"),
+            errores=pred_defectos,
+        )
         
         if len(similares) > 0:
             st.dataframe(similares, use_container_width=True)
@@ -836,10 +884,128 @@ def render_prediccion(df_proyectos: pd.DataFrame, kpis: dict):
         
         st.markdown(resumen_html, unsafe_allow_html=True)
 
+    render_explorador_what_if(df_proyectos, modelo)
+
+    # Reentrenar repite la selección por validación cruzada: nunca reemplaza al ganador por un modelo no validado
     if st.button("Reentrenar modelo con datos actualizados"):
-        entrenar_modelo.clear()
-        st.success("Modelo reentrenado exitosamente con los datos más recientes.")
-        st.info("El modelo ahora incorpora todos los proyectos en el sistema para mejorar la precisión.")
+        if get_entrenamiento().iniciar(df_proyectos):
+            st.info(
+                "Reentrenamiento en segundo plano: se comparan los modelos candidatos y el ganador "
+                "se usará en esta pestaña al terminar (ver \"Selección de modelo\")."
+            )
+        else:
+            st.info("Ya hay un reentrenamiento en curso.")
+
+
+def render_seleccion_modelo(df_proyectos: pd.DataFrame, metadatos: dict):
+    """Comparación de regresores por validación cruzada, entrenados en segundo plano"""
+    with st.expander("Selección de modelo (validación cruzada)"):
+        if metadatos:
+            st.caption(
+                f"Modelo vigente: **{metadatos['estimador']}** (versión {metadatos['version']}, "
+                f"entrenado {metadatos['entrenado']}, {metadatos.get('validacion', 'métricas sobre entrenamiento')})"
+            )
+        st.caption(
+            "Compara regresión lineal, ridge, gradient boosting y GLM de Poisson con k-fold; "
+            "el de menor RMSE fuera de fold pasa a usarse en esta pestaña."
+        )
+        if st.button("Comparar modelos en segundo plano", key="seleccion_modelo_iniciar"):
+            if not get_entrenamiento().iniciar(df_proyectos):
+                st.info("Ya hay una comparación en curso.")
+        _estado_seleccion_modelo()
+
+
+def _estado_seleccion_modelo():
+    entrenamiento = get_entrenamiento()
+    if entrenamiento.estado == "en curso":
+        # Sólo se consulta periódicamente mientras hay una comparación en curso
+        _seguir_seleccion_modelo()
+    elif entrenamiento.estado == "error":
+        st.error(f"La comparación falló: {entrenamiento.error}")
+    elif entrenamiento.estado == "listo":
+        resultado = entrenamiento.resultado
+        st.success(
+            f"Ganador: **{resultado['seleccion'][0]['Modelo']}** "
+            f"(versión {resultado['version']}, {entrenamiento.segundos} s)"
+        )
+        st.dataframe(pd.DataFrame(resultado["seleccion"]), use_container_width=True, hide_index=True)
+
+
+@st.fragment(run_every=3)
+def _seguir_seleccion_modelo():
+    entrenamiento = get_entrenamiento()
+    if entrenamiento.estado != "en curso":
+        # Al terminar se vuelve a ejecutar la app completa para usar el nuevo modelo (y dejar de consultar)
+        st.rerun()
+    st.info(f"Entrenando candidatos desde {entrenamiento.inicio}...")
+
+
+def render_explorador_what_if(df_proyectos: pd.DataFrame, modelo):
+    """Superficie de sensibilidad del modelo de defectos sobre dos parámetros a la vez"""
+    st.markdown("---")
+    st.subheader("Explorador What-If")
+    st.caption(
+        "Barre dos parámetros del modelo sobre su rango histórico; el resto se fija en la mediana "
+        "de los proyectos históricos."
+    )
+
+    col_ejes1, col_ejes2, col_ejes3 = st.columns(3)
+    with col_ejes1:
+        eje_x = st.selectbox("Eje X", COLUMNAS_FEATURES, index=0, key="whatif_eje_x")
+    with col_ejes2:
+        opciones_y = [col for col in COLUMNAS_FEATURES if col != eje_x]
+        eje_y = st.selectbox("Eje Y", opciones_y, index=0, key="whatif_eje_y")
+    with col_ejes3:
+        resolucion = st.slider("Resolución de la grilla", 10, 200, 60, step=10, key="whatif_resolucion")
+
+    col_param1, col_param2, col_param3 = st.columns(3)
+    with col_param1:
+        duracion = st.slider("Duración (semanas)", 1, 100, 52, key="whatif_duracion")
+    with col_param2:
+        complejidad = st.selectbox("Complejidad", ["baja", "media", "alta"], index=1, key="whatif_complejidad")
+    with col_param3:
+        metrica = st.selectbox(
+            "Métrica", ["Defectos totales", "Defectos en la semana pico"], index=0, key="whatif_metrica"
+        )
+
+    historico = df_proyectos[COLUMNAS_FEATURES].astype(float)
+    base = historico.median().fillna(0).to_dict()
+
+    def rango(columna):
+        minimo, maximo = historico[columna].min(), historico[columna].max()
+        if pd.isna(minimo) or minimo == maximo:
+            centro = 0.0 if pd.isna(minimo) else minimo
+            minimo, maximo = centro - 1, centro + 1
+        return np.linspace(minimo, maximo, resolucion)
+
+    superficie = superficie_sensibilidad(
+        modelo, eje_x, rango(eje_x), eje_y, rango(eje_y), base, duracion, complejidad
+    )
+    valores = superficie["defectos"] if metrica == "Defectos totales" else superficie["defectos_pico"]
+
+    # Una sola tabla larga para toda la grilla (nada por celda)
+    grilla_x, grilla_y = np.meshgrid(superficie["x"], superficie["y"])
+    datos = pd.DataFrame({eje_x: grilla_x.ravel(), eje_y: grilla_y.ravel(), metrica: valores.ravel()})
+
+    paso_x = (superficie["x"][1] - superficie["x"][0]) / 2
+    paso_y = (superficie["y"][1] - superficie["y"][0]) / 2
+    datos["x2"], datos["y2"] = datos[eje_x] + paso_x, datos[eje_y] + paso_y
+    datos[eje_x], datos[eje_y] = datos[eje_x] - paso_x, datos[eje_y] - paso_y
+
+    heatmap = alt.Chart(datos).mark_rect().encode(
+        x=alt.X(f"{eje_x}:Q", title=eje_x),
+        x2="x2",
+        y=alt.Y(f"{eje_y}:Q", title=eje_y),
+        y2="y2",
+        color=alt.Color(f"{metrica}:Q", scale=alt.Scale(scheme="orangered")),
+        tooltip=[alt.Tooltip(f"{metrica}:Q", format=".1f")],
+    ).properties(height=420)
+    st.altair_chart(heatmap, use_container_width=True)
+
+    st.caption(
+        f"Pico de detección en la semana {superficie['semana_pico']:.1f}. "
+        f"Rango de {metrica.lower()}: {np.nanmin(valores):.1f} a {np.nanmax(valores):.1f}."
+    )
 
 
 def render_metricas_calculadas(filtros: dict):
@@ -861,9 +1027,24 @@ def render_metricas_calculadas(filtros: dict):
         </div>
     """, unsafe_allow_html=True)
     
-    # Obtener dataframe con todas las métricas calculadas
-    df_metricas = generar_dataframe_metricas_calculadas()
-    stats = obtener_estadisticas_metricas_calculadas()
+    # Por defecto, las métricas precalculadas por el ETL; el recálculo en vivo desde las tablas
+    # base (dss/metricas_incrementales.py) es otro cálculo y se muestra sólo a pedido
+    recalcular = st.toggle(
+        "Recalcular en vivo desde las tablas base",
+        key="metricas_recalculadas",
+        help="Incluye las filas insertadas en el DWH desde la última carga del snapshot",
+    )
+    if recalcular:
+        df_metricas = generar_dataframe_metricas_recalculadas()
+        st.caption(
+            "Cálculo distinto al del ETL: el costo real suma las horas valorizadas de las asignaciones "
+            "y los gastos de dim_gastos del proyecto, y la productividad divide las horas reales entre "
+            "los hitos. Por eso CosteReal, DesviacionPresupuestal y ProductividadPromedio pueden no "
+            "coincidir con los valores del DWH."
+        )
+    else:
+        df_metricas = generar_dataframe_metricas_calculadas()
+    stats = obtener_estadisticas_metricas_calculadas(df_metricas)
     
     # Verificar que hay datos
     if df_metricas.empty:
@@ -905,16 +1086,13 @@ def render_metricas_calculadas(filtros: dict):
         st.write(f"**Columnas en df_completo:** {', '.join(list(df_completo.columns))}")
         st.write(f"**Número de registros:** {len(df_completo)}")
         st.dataframe(df_completo.head(3))
+        tiempos_carga = obtener_tiempos_carga_tablas()
+        if not tiempos_carga.empty:
+            st.write(f"**Carga de tablas del DWH:** {tiempos_carga['Segundos'].sum():.3f} s acumulados")
+            st.dataframe(tiempos_carga, use_container_width=True)
     
     # Aplicar filtros
-    if filtros.get("anio") and "AnioFin" in df_completo.columns:
-        df_completo = df_completo[df_completo["AnioFin"].isin(filtros["anio"])]
-    if filtros.get("mes") and "MesFin" in df_completo.columns:
-        df_completo = df_completo[df_completo["MesFin"].isin(filtros["mes"])]
-    if filtros.get("cliente") and "CodigoClienteReal" in df_completo.columns:
-        df_completo = df_completo[df_completo["CodigoClienteReal"].isin(filtros["cliente"])]
-    if filtros.get("proyecto") and "CodigoProyecto" in df_completo.columns:
-        df_completo = df_completo[df_completo["CodigoProyecto"].isin(filtros["proyecto"])]
+    df_completo = aplicar_filtros(df_completo, filtros)
     
     # Panel de resumen
     st.subheader("Resumen de Métricas Calculadas")
@@ -1113,12 +1291,12 @@ def render_metricas_calculadas(filtros: dict):
             st.info("Datos no disponibles para esta visualización")
 
 
-def render_okrs(df_proyectos: pd.DataFrame, df_asignaciones: pd.DataFrame, filtros: dict):
+def render_okrs(contexto: ContextoAnalitico):
     """
     Vista que muestra los OKRs (Objectives and Key Results) con progreso y estado
     """
     # Calcular KPIs
-    kpis = get_kpis(df_proyectos, df_asignaciones, filtros)
+    kpis = contexto.kpis
     
     # Calcular progreso de OKRs
     okrs_progreso = calcular_todos_okrs(kpis)
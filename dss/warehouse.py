@@ -0,0 +1,304 @@
+"""
+Snapshot único del Data Warehouse compartido por todas las vistas
+
+Cada tabla base se consulta una sola vez (vía dss/snapshots.py) y los JOINs de
+proyectos y asignaciones, así como el DataFrame de métricas calculadas, se
+derivan en memoria a partir de las mismas tablas. Todas las pestañas ven así
+la misma versión de los datos y se refrescan juntas (WAREHOUSE_TTL).
+"""
+import hashlib
+import json
+import threading
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from .config import WAREHOUSE_TTL
+from .db_config import DatabaseConfig
+from .snapshots import TABLAS_DWH, get_snapshot_store
+
+# Copy-on-Write (por defecto desde pandas 3): los DataFrames derivados de un snapshot
+# (filtros, selecciones, merges) comparten sus buffers y sólo copian la columna que modifican
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Columnas resultantes de los JOINs (mismo orden que QUERY_PROYECTOS / QUERY_ASIGNACIONES)
+COLUMNAS_PROYECTOS = [
+    "ID_Proyecto", "CodigoProyecto", "Version", "Cancelado", "TotalErrores", "NumTrabajadores",
+    "CodigoClienteReal", "TipoGasto", "Categoria",
+    "Presupuesto", "CosteReal", "DesviacionPresupuestal", "PenalizacionesMonto",
+    "ProporcionCAPEX_OPEX", "RetrasoInicioDias", "RetrasoFinalDias",
+    "TasaDeErroresEncontrados", "TasaDeExitoEnPruebas", "ProductividadPromedio",
+    "PorcentajeTareasRetrasadas", "PorcentajeHitosRetrasados",
+    "AnioInicio", "MesInicio", "AnioFin", "MesFin",
+]
+
+COLUMNAS_ASIGNACIONES = [
+    "ID_Empleado", "CodigoEmpleado", "Rol", "Seniority", "ID_Proyecto", "CodigoProyecto",
+    "HorasPlanificadas", "HorasReales", "ValorHoras", "RetrasoHoras", "Anio", "Mes",
+]
+
+COLUMNAS_NUMERICAS_PROYECTOS = [
+    "Version", "Cancelado", "TotalErrores", "NumTrabajadores",
+    "Presupuesto", "CosteReal", "DesviacionPresupuestal", "PenalizacionesMonto",
+    "ProporcionCAPEX_OPEX", "RetrasoInicioDias", "RetrasoFinalDias",
+    "TasaDeErroresEncontrados", "TasaDeExitoEnPruebas", "ProductividadPromedio",
+    "PorcentajeTareasRetrasadas", "PorcentajeHitosRetrasados",
+    "AnioInicio", "MesInicio", "AnioFin", "MesFin",
+]
+
+# Métricas precalculadas en hechos_proyectos
+COLUMNAS_METRICAS = [
+    "ID_Proyecto",
+    "RetrasoInicioDias",
+    "RetrasoFinalDias",
+    "Presupuesto",
+    "CosteReal",
+    "DesviacionPresupuestal",
+    "PenalizacionesMonto",
+    "ProporcionCAPEX_OPEX",
+    "TasaDeErroresEncontrados",
+    "TasaDeExitoEnPruebas",
+    "ProductividadPromedio",
+    "PorcentajeTareasRetrasadas",
+    "PorcentajeHitosRetrasados",
+]
+
+COLUMNAS_PORCENTAJE = [
+    "TasaDeErroresEncontrados", "TasaDeExitoEnPruebas",
+    "PorcentajeTareasRetrasadas", "PorcentajeHitosRetrasados",
+]
+
+# Registro de esquema: tipo compacto de cada columna de los DataFrames derivados del DWH.
+# Los montos (Presupuesto, CosteReal, ValorHoras, ...) y los códigos no figuran: se dejan como llegan
+CATEGORIA = "categoria"   # dimensiones de baja cardinalidad (groupby por código)
+ENTERO = "int32"          # IDs, conteos, días, horas y calendario: cabe la aritmética entre columnas sin desbordar
+BANDERA = "int8"          # indicadores 0/1, sólo se comparan
+REAL32 = "float32"        # tasas y proporciones, donde la precisión simple alcanza
+
+# Cada columna tiene un tipo fijo (no depende de los valores cargados), así el dtype es el mismo
+# entre snapshots y entre el DataFrame completo y el filtrado en SQL
+ESQUEMA_DWH = {
+    "ID_Proyecto": ENTERO, "ID_Empleado": ENTERO,
+    "Version": ENTERO, "Cancelado": BANDERA, "TotalErrores": ENTERO, "NumTrabajadores": ENTERO,
+    "RetrasoInicioDias": ENTERO, "RetrasoFinalDias": ENTERO,
+    "HorasPlanificadas": ENTERO, "HorasReales": ENTERO, "RetrasoHoras": ENTERO,
+    "AnioInicio": ENTERO, "MesInicio": ENTERO, "AnioFin": ENTERO, "MesFin": ENTERO, "Anio": ENTERO, "Mes": ENTERO,
+    "Rol": CATEGORIA, "Seniority": CATEGORIA, "TipoGasto": CATEGORIA, "Categoria": CATEGORIA,
+    "ProporcionCAPEX_OPEX": REAL32, "TasaDeErroresEncontrados": REAL32, "TasaDeExitoEnPruebas": REAL32,
+    "ProductividadPromedio": REAL32, "PorcentajeTareasRetrasadas": REAL32, "PorcentajeHitosRetrasados": REAL32,
+}
+
+
+class WarehouseSnapshot:
+    """Tablas base del DWH cargadas una vez, con DataFrames derivados memorizados"""
+
+    def __init__(self, tablas: Dict[str, pd.DataFrame], version: str, tiempos_carga: Optional[pd.DataFrame] = None):
+        self.tablas = tablas
+        self.version = version
+        # Origen (bd/disco), filas y segundos de carga de cada tabla base
+        self.tiempos_carga = tiempos_carga if tiempos_carga is not None else pd.DataFrame()
+        self._derivados = {}
+        self._lock = threading.RLock()
+
+    def derivado(self, nombre: str, constructor: Callable[["WarehouseSnapshot"], object]):
+        """
+        Retorna un objeto derivado del snapshot, construyéndolo sólo la primera vez
+
+        Args:
+            nombre: Clave del derivado
+            constructor: Función que recibe el snapshot y construye el derivado
+        """
+        with self._lock:
+            if nombre not in self._derivados:
+                self._derivados[nombre] = constructor(self)
+            return self._derivados[nombre]
+
+    @property
+    def proyectos(self) -> pd.DataFrame:
+        """Hechos de proyectos con sus dimensiones (equivalente a QUERY_PROYECTOS)"""
+        return self.derivado("proyectos", lambda snap: solo_lectura(construir_df_proyectos(snap)))
+
+    @property
+    def asignaciones(self) -> pd.DataFrame:
+        """Hechos de asignaciones con sus dimensiones (equivalente a QUERY_ASIGNACIONES)"""
+        return self.derivado("asignaciones", lambda snap: solo_lectura(construir_df_asignaciones(snap)))
+
+    @property
+    def metricas(self) -> pd.DataFrame:
+        """Métricas precalculadas de hechos_proyectos, porcentajes en escala 0-1"""
+        return self.derivado("metricas", lambda snap: solo_lectura(construir_df_metricas(snap)))
+
+
+def convertir_numericos(df: pd.DataFrame, columnas) -> pd.DataFrame:
+    """Convierte a número las columnas que no llegaron tipadas (VARCHAR/TEXT en la BD)"""
+    for col in columnas:
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def porcentajes_a_decimal(df: pd.DataFrame, maximos: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """
+    Convierte porcentajes a decimal (0-1) si están en formato 0-100
+
+    Args:
+        df: DataFrame con columnas de porcentaje
+        maximos: Máximo de cada columna en la tabla completa; por defecto se usa el del propio df
+    """
+    for col in COLUMNAS_PORCENTAJE:
+        if col in df.columns:
+            max_val = maximos.get(col) if maximos is not None else df[col].max()
+            if not pd.isna(max_val) and max_val > 1:
+                df[col] = df[col] / 100
+    return df
+
+
+def solo_lectura(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Retorna `df` sobre los mismos buffers marcados como de sólo lectura (sin copiar datos)
+
+    Los DataFrames del snapshot se entregan tal cual a todas las sesiones: una escritura
+    en el lugar (df.loc[...] = ...) falla en lugar de alterar los datos de las demás, y
+    las copias y vistas derivadas aplican copy-on-write. Las columnas de texto no
+    categóricas se comparten sin protección.
+    """
+    columnas = {}
+    for col in df.columns:
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.array.codes
+            codigos.flags.writeable = False
+            columnas[col] = pd.Categorical.from_codes(codigos, dtype=serie.dtype, validate=False)
+        elif isinstance(serie.dtype, np.dtype) and serie.dtype != object:
+            valores = serie.to_numpy()
+            valores.flags.writeable = False
+            columnas[col] = valores
+        else:
+            columnas[col] = serie.array
+    resultado = pd.DataFrame(columnas, index=df.index, copy=False)
+    resultado.attrs.update(df.attrs)
+    return resultado
+
+
+def aplicar_esquema(df: pd.DataFrame, esquema: Dict[str, str] = ESQUEMA_DWH) -> pd.DataFrame:
+    """
+    Convierte las columnas de `df` a los tipos compactos del registro de esquema
+
+    Las columnas enteras con nulos (p. ej. por un LEFT JOIN sin match) o con valores
+    fuera del rango de su tipo se dejan como llegaron (float64/int64) en lugar de perder
+    la semántica NaN o desbordar; las agrupaciones sobre columnas categóricas deben usar
+    observed=True.
+    """
+    for col, tipo in esquema.items():
+        if col not in df.columns:
+            continue
+        serie = df[col]
+        if tipo == CATEGORIA:
+            if not isinstance(serie.dtype, pd.CategoricalDtype):
+                df[col] = serie.astype("category")
+        elif not pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_bool_dtype(serie):
+            continue
+        elif tipo in (ENTERO, BANDERA):
+            limites = np.iinfo(tipo)
+            if (
+                not serie.isna().any()
+                and (pd.api.types.is_integer_dtype(serie) or (serie % 1 == 0).all())
+                and (serie.empty or (serie.min() >= limites.min and serie.max() <= limites.max))
+            ):
+                df[col] = serie.astype(tipo)
+        elif tipo == REAL32:
+            df[col] = serie.astype("float32")
+    return df
+
+
+def _tabla(snapshot: WarehouseSnapshot, nombre: str, columnas) -> pd.DataFrame:
+    # Las claves de JOIN se comparan numéricamente, como lo hace TiDB con columnas VARCHAR
+    df = snapshot.tablas[nombre][columnas].copy()
+    return convertir_numericos(df, [col for col in columnas if col.startswith("ID_")])
+
+
+def construir_df_proyectos(snapshot: WarehouseSnapshot) -> pd.DataFrame:
+    """LEFT JOIN de hechos_proyectos con proyectos, clientes, gastos y tiempo (inicio/fin)"""
+    hp = _tabla(snapshot, "hechos_proyectos", [
+        "ID_Proyecto", "ID_Gasto", "ID_FechaInicio", "ID_FechaFin",
+        "Presupuesto", "CosteReal", "DesviacionPresupuestal", "PenalizacionesMonto",
+        "ProporcionCAPEX_OPEX", "RetrasoInicioDias", "RetrasoFinalDias",
+        "TasaDeErroresEncontrados", "TasaDeExitoEnPruebas", "ProductividadPromedio",
+        "PorcentajeTareasRetrasadas", "PorcentajeHitosRetrasados",
+    ])
+    dp = _tabla(snapshot, "dim_proyectos", [
+        "ID_Proyecto", "ID_Cliente", "CodigoProyecto", "Version", "Cancelado", "TotalErrores", "NumTrabajadores",
+    ])
+    dc = _tabla(snapshot, "dim_clientes", ["ID_Cliente", "CodigoClienteReal"])
+    dg = _tabla(snapshot, "dim_gastos", ["ID_Finanza", "TipoGasto", "Categoria"])
+    dt = _tabla(snapshot, "dim_tiempo", ["ID_Tiempo", "Anio", "Mes"])
+
+    df = hp.merge(dp, on="ID_Proyecto", how="left")
+    df = df.merge(dc, on="ID_Cliente", how="left")
+    df = df.merge(dg, left_on="ID_Gasto", right_on="ID_Finanza", how="left")
+    df = df.merge(
+        dt.rename(columns={"ID_Tiempo": "ID_FechaInicio", "Anio": "AnioInicio", "Mes": "MesInicio"}),
+        on="ID_FechaInicio", how="left",
+    )
+    df = df.merge(
+        dt.rename(columns={"ID_Tiempo": "ID_FechaFin", "Anio": "AnioFin", "Mes": "MesFin"}),
+        on="ID_FechaFin", how="left",
+    )
+
+    df = df[COLUMNAS_PROYECTOS].copy()
+    convertir_numericos(df, COLUMNAS_NUMERICAS_PROYECTOS)
+    return aplicar_esquema(porcentajes_a_decimal(df))
+
+
+def construir_df_asignaciones(snapshot: WarehouseSnapshot) -> pd.DataFrame:
+    """LEFT JOIN de hechos_asignaciones con empleados, proyectos y tiempo"""
+    ha = _tabla(snapshot, "hechos_asignaciones", [
+        "ID_Empleado", "ID_Proyecto", "ID_FechaAsignacion",
+        "HorasPlanificadas", "HorasReales", "ValorHoras", "RetrasoHoras",
+    ])
+    de = _tabla(snapshot, "dim_empleados", ["ID_Empleado", "CodigoEmpleado", "Rol", "Seniority"])
+    dp = _tabla(snapshot, "dim_proyectos", ["ID_Proyecto", "CodigoProyecto"])
+    dt = _tabla(snapshot, "dim_tiempo", ["ID_Tiempo", "Anio", "Mes"])
+
+    df = ha.merge(de, on="ID_Empleado", how="left")
+    df = df.merge(dp, on="ID_Proyecto", how="left")
+    df = df.merge(dt, left_on="ID_FechaAsignacion", right_on="ID_Tiempo", how="left")
+
+    df = df[COLUMNAS_ASIGNACIONES].copy()
+    convertir_numericos(df, ["HorasPlanificadas", "HorasReales", "ValorHoras", "RetrasoHoras", "Anio", "Mes"])
+    return aplicar_esquema(df)
+
+
+def construir_df_metricas(snapshot: WarehouseSnapshot) -> pd.DataFrame:
+    """Selecciona las métricas precalculadas de hechos_proyectos"""
+    df_hechos = snapshot.tablas["hechos_proyectos"]
+
+    # Filtrar solo las columnas que existen
+    columnas_existentes = [col for col in COLUMNAS_METRICAS if col in df_hechos.columns]
+    if len(columnas_existentes) == 0:
+        return pd.DataFrame()
+
+    df_metricas = df_hechos[columnas_existentes].copy()
+    # No convertir ID
+    convertir_numericos(df_metricas, [col for col in columnas_existentes if col != "ID_Proyecto"])
+    porcentajes_a_decimal(df_metricas)
+
+    print(f"✅ Métricas cargadas para {len(df_metricas)} proyectos")
+    return df_metricas
+
+
+@st.cache_resource(show_spinner=False, ttl=WAREHOUSE_TTL)
+def cargar_warehouse() -> WarehouseSnapshot:
+    """
+    Carga (o reutiliza) el snapshot del Data Warehouse compartido por todas las sesiones
+    Cada tabla base se lee una sola vez; sólo se consultan en la BD las que cambiaron
+    """
+    store = get_snapshot_store()
+    tablas = store.cargar_tablas(TABLAS_DWH, max_concurrencia=DatabaseConfig().max_concurrencia)
+    tablas = {nombre: solo_lectura(df) for nombre, df in tablas.items()}
+    marcas = store.marcas_vigentes(TABLAS_DWH)
+    version = hashlib.sha1(json.dumps(marcas, sort_keys=True).encode()).hexdigest()[:12]
+    return WarehouseSnapshot(tablas, version, store.tiempos_de_carga(TABLAS_DWH))
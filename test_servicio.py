@@ -0,0 +1,174 @@
+"""
+Script para verificar el servicio HTTP de predicción (dss/servicio.py)
+
+Levanta el servicio en un puerto libre con un modelo entrenado sobre datos sintéticos
+(no requiere BD) y comprueba las respuestas 400 ante solicitudes inválidas, que las
+predicciones concurrentes se agrupen en lotes con los mismos resultados que
+predecir_escenarios, y que un lote fallido no detenga el procesamiento de los siguientes.
+"""
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import uvicorn
+from sklearn.linear_model import LinearRegression
+
+from dss.prediction import COLUMNAS_FEATURES, predecir_escenarios
+from dss.servicio import LotePredicciones, crear_app
+
+fallos = []
+
+
+def verificar(condicion: bool, descripcion: str):
+    print(f"{'✅' if condicion else '❌'} {descripcion}")
+    if not condicion:
+        fallos.append(descripcion)
+
+
+def solicitar(ruta: str, cuerpo=None, crudo: bytes = None):
+    datos = crudo if crudo is not None else (None if cuerpo is None else json.dumps(cuerpo).encode())
+    solicitud = urllib.request.Request(BASE + ruta, data=datos, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(solicitud) as respuesta:
+            return respuesta.status, json.loads(respuesta.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}") if e.code == 400 else {}
+
+
+print("=" * 80)
+print("PRUEBA DEL SERVICIO DE PREDICCIÓN")
+print("=" * 80)
+
+# Modelo sintético con las mismas features que el de defectos
+rng = np.random.default_rng(0)
+X = pd.DataFrame(rng.uniform(0, 1, (200, len(COLUMNAS_FEATURES))) * [1e6, 30, 20, 20, 1], columns=COLUMNAS_FEATURES)
+y = X.to_numpy() @ [2e-5, 0.8, 0.3, 0.5, 4] + rng.normal(0, 1, 200)
+modelo = LinearRegression().fit(X, y)
+
+with socket.socket() as s:
+    s.bind(("127.0.0.1", 0))
+    puerto = s.getsockname()[1]
+BASE = f"http://127.0.0.1:{puerto}"
+
+servidor = uvicorn.Server(uvicorn.Config(crear_app(modelo, {"version": 0}), host="127.0.0.1", port=puerto, log_level="warning"))
+threading.Thread(target=servidor.run, daemon=True).start()
+while not servidor.started:
+    time.sleep(0.05)
+
+# Test 1: solicitudes inválidas -> 400
+print("\n1. Solicitudes inválidas...")
+escenario = {"presupuesto": 100000, "trabajadores": 8, "duracion": 52}
+invalidas = [
+    ("/prediccion", None, b"no es json"),
+    ("/prediccion", {}, None),
+    ("/prediccion", {"escenarios": []}, None),
+    ("/prediccion", {"escenarios": [1]}, None),
+    ("/prediccion", {"escenarios": [{**escenario, "presupuesto": "x"}]}, None),
+    ("/prediccion", {"escenarios": [{**escenario, "presupuesto": [1]}]}, None),
+    ("/prediccion", {"escenarios": [{**escenario, "duracion": 3.5}]}, None),
+    ("/prediccion", {"escenarios": [{**escenario, "duracion": 0}]}, None),
+    ("/prediccion", {"escenarios": [{**escenario, "duracion": 10000}]}, None),
+    ("/prediccion", {"escenarios": [{**escenario, "trabajadores": 0}]}, None),
+    ("/prediccion", {"escenarios": [{**escenario, "complejidad": "z"}]}, None),
+    ("/prediccion", {"escenarios": [{**escenario, "complejidad": ["x"]}]}, None),
+    ("/prediccion", {"escenarios": [{**escenario, "complejidad": {"a": 1}}]}, None),
+    ("/curva", [], None),
+    ("/curva", {"defectos": 40, "duracion": 6, "sigma": 0}, None),
+    ("/curva", {"defectos": 40, "duracion": 6, "sigma": -1}, None),
+    ("/curva", {"defectos": 40, "duracion": 0}, None),
+    ("/curva", {"defectos": 40, "duracion": 6, "complejidad": ["x"]}, None),
+    ("/riesgo", {"defectos": 1, "trabajadores": 0, "duracion": 1}, None),
+]
+for ruta, cuerpo, crudo in invalidas:
+    estado, respuesta = solicitar(ruta, cuerpo, crudo)
+    verificar(estado == 400 and "error" in respuesta, f"{ruta} {cuerpo if crudo is None else crudo!r} -> {estado} {respuesta.get('error', '')}")
+
+# Test 2: solicitudes válidas
+print("\n2. Solicitudes válidas...")
+estado, respuesta = solicitar("/curva", {"defectos": 40, "duracion": 6, "sigma": 2.5})
+verificar(estado == 200 and len(respuesta["acumulados"]) == 7, f"/curva con sigma -> {estado}")
+estado, respuesta = solicitar("/prediccion", {"escenarios": [escenario], "curvas": True})
+verificar(estado == 200 and len(respuesta["escenarios"][0]["curva"]) == 53, f"/prediccion con curva -> {estado}")
+estado, respuesta = solicitar("/salud")
+verificar(estado == 200 and respuesta["modelo"] == 0, f"/salud -> {estado} {respuesta}")
+
+# Test 3: predicciones concurrentes agrupadas en lotes
+print("\n3. Predicciones concurrentes...")
+
+
+def predecir_aleatorio(semilla: int) -> bool:
+    azar = np.random.default_rng(semilla)
+    escenarios = [
+        {
+            "presupuesto": float(azar.uniform(1e4, 1e6)),
+            "trabajadores": int(azar.integers(1, 20)),
+            "duracion": int(azar.integers(1, 100)),
+            "complejidad": str(azar.choice(["baja", "media", "alta"])),
+        }
+        for _ in range(3)
+    ]
+    estado, respuesta = solicitar("/prediccion", {"escenarios": escenarios})
+    esperado = predecir_escenarios(
+        modelo,
+        [e["presupuesto"] for e in escenarios],
+        [e["trabajadores"] for e in escenarios],
+        [e["duracion"] for e in escenarios],
+        complejidad=np.array([e["complejidad"] for e in escenarios]),
+    )
+    obtenido = [e["defectos"] for e in respuesta.get("escenarios", [])]
+    return estado == 200 and np.allclose(obtenido, esperado["defectos"])
+
+
+with ThreadPoolExecutor(32) as ejecutor:
+    correctos = list(ejecutor.map(predecir_aleatorio, range(300)))
+verificar(all(correctos), f"{sum(correctos)}/{len(correctos)} solicitudes concurrentes con el resultado esperado")
+estado, respuesta = solicitar("/metricas")
+lotes = respuesta["lotes"]
+verificar(lotes["escenarios_maximo"] > 3, f"Lotes agrupados: {lotes}")
+
+servidor.should_exit = True
+
+# Test 4: un lote fallido no detiene los siguientes
+print("\n4. Recuperación tras un lote fallido...")
+
+
+async def lote_fallido_y_siguiente():
+    lote = LotePredicciones(modelo, espera_ms=1)
+    lote.iniciar()
+    columnas = {
+        "presupuesto": np.array([1e5]), "trabajadores": np.array([8.0]), "duracion": np.array([52]),
+        "retraso_inicio": np.array([0.0]), "retraso_final": np.array([0.0]),
+        "complejidad": np.array(["media"]), "productividad": np.array([0.75]),
+    }
+    try:
+        # Sin la columna "complejidad" la concatenación del lote falla
+        await asyncio.wait_for(lote.predecir({campo: valor for campo, valor in columnas.items() if campo != "complejidad"}), 5)
+        fallo = False
+    except asyncio.TimeoutError:
+        fallo = False
+    except Exception:
+        fallo = True
+    try:
+        resultado = await asyncio.wait_for(lote.predecir(columnas), 5)
+    except asyncio.TimeoutError:
+        resultado = None
+    await lote.detener()
+    return fallo, resultado
+
+
+fallo, resultado = asyncio.run(lote_fallido_y_siguiente())
+verificar(fallo, "La solicitud del lote fallido recibe el error")
+verificar(resultado is not None and len(resultado["defectos"]) == 1, "El lote siguiente se procesa normalmente")
+
+print("\n" + "=" * 80)
+print(f"{'❌ ' + str(len(fallos)) + ' verificaciones fallidas' if fallos else '✅ Todas las verificaciones pasaron'}")
+print("=" * 80)
+sys.exit(1 if fallos else 0)